@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import importlib
 import os
 import sys
 from datetime import datetime
@@ -6,18 +8,82 @@ from datetime import datetime
 import dotenv
 from loguru import logger
 
-from . import ChallengeBot
+from .boot import BootProfile
 from .config import BotMode, Config
-from .database import Database
+from .tracing import add_trace_id
 
 
-async def async_main(config: Config):
-    async with Database(config.database_url) as database:
-        async with ChallengeBot(config, database) as client:
+# Everything importing discord.py or SQLAlchemy is imported inside the functions
+# below, so that it's only loaded when needed (see tests/test_import_time.py).
+async def async_main(config: Config, force_sync: bool, profile: BootProfile):
+    with profile.phase("import bot"):
+        from .bot import ChallengeBot
+        from .database import Database
+
+    # The bot prepares the database itself, concurrently with logging in.
+    database = Database(config)
+
+    try:
+        async with ChallengeBot(config, database, force_sync, profile) as client:
             await client.start(config.bot_token, reconnect=True)
+    finally:
+        await database.close()
+
+
+async def explain_queries(config: Config):
+    from .database import Database
+
+    async with Database(config) as database:
+        for name, plan in (await database.explain_hot_queries()).items():
+            print(f"{name}:")
+            for line in plan:
+                print(f"    {line}")
+
+
+async def lease_demo(config: Config):
+    from .database import Database
+    from .leader import LeaderElector
+
+    async def on_elected():
+        logger.success("Elected leader, this instance would now run the scheduler")
+
+    async def on_deposed():
+        logger.warning("Deposed, this instance would no longer run the scheduler")
+
+    async with Database(config) as database:
+        elector = LeaderElector(
+            database, "scheduler", config.lease_ttl, on_elected, on_deposed
+        )
+        elector.start()
+
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await elector.stop()
 
 
 def main():
+    profile = BootProfile()
+
+    parser = argparse.ArgumentParser(prog="weekly_ctf_bot")
+    parser.add_argument(
+        "--explain-queries",
+        action="store_true",
+        help="print the query plan of each hot database query, then exit",
+    )
+    parser.add_argument(
+        "--force-sync",
+        action="store_true",
+        help="sync the slash commands with Discord even if they haven't changed",
+    )
+    parser.add_argument(
+        "--lease-demo",
+        action="store_true",
+        help="only contend for the scheduler lease without connecting to Discord,"
+        " to try failover between several instances",
+    )
+    args = parser.parse_args()
+
     dotenv.load_dotenv()
     config = Config()
 
@@ -30,6 +96,9 @@ def main():
 
     logger.remove()  # remove default handler
 
+    # Every record made while handling an interaction carries its trace ID.
+    logger.configure(patcher=add_trace_id)
+
     logger.add(sys.stderr, level="ERROR")
     logger.add(
         sys.stdout,
@@ -41,12 +110,21 @@ def main():
     logger.add(
         os.path.join(log_dir, log_filename),
         level=level,
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}",
+        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {extra[trace_id]} | {name}:{function}:{line} - {message}",
         rotation="2 MB",
         diagnose=config.bot_mode == BotMode.DEVELOPMENT,
     )
 
-    asyncio.run(async_main(config))
+    if args.explain_queries:
+        asyncio.run(explain_queries(config))
+    elif args.lease_demo:
+        asyncio.run(lease_demo(config))
+    else:
+        for module in ["discord", "sqlalchemy.ext.asyncio"]:
+            with profile.phase(f"import {module}"):
+                importlib.import_module(module)
+
+        asyncio.run(async_main(config, args.force_sync, profile))
 
 
 if __name__ == "__main__":
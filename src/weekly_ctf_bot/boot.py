@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Awaitable, Iterator
+
+from loguru import logger
+
+
+@dataclass(slots=True)
+class Phase:
+    name: str
+    start: float
+    duration: float
+
+
+class BootProfile:
+    started: float
+    phases: list[Phase]
+    reported: bool
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.phases = []
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases.append(
+                Phase(name, start - self.started, perf_counter() - start)
+            )
+
+    async def timed[R](self, name: str, awaitable: Awaitable[R]) -> R:
+        with self.phase(name):
+            return await awaitable
+
+    # Phases can overlap, so each is shown with when it started as well as how
+    # long it took.
+    def report(self):
+        if self.reported:
+            return
+
+        self.reported = True
+        total = perf_counter() - self.started
+        width = max((len(phase.name) for phase in self.phases), default=0)
+
+        lines = [f"Boot took {total:.3f}s:"]
+        for phase in sorted(self.phases, key=lambda phase: phase.start):
+            lines.append(
+                f"    {phase.name:<{width}}  at {phase.start:7.3f}s  took {phase.duration:7.3f}s"
+            )
+
+        logger.info("\n".join(lines))
@@ -0,0 +1,694 @@
+import importlib.metadata
+import traceback
+from asyncio import Semaphore, Task, gather, get_running_loop, sleep
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from platform import python_version
+from time import monotonic, perf_counter
+from typing import Any, Sequence
+
+from discord import (
+    ClientException,
+    Color,
+    Embed,
+    Intents,
+    Interaction,
+    InteractionResponded,
+    Role,
+    TextChannel,
+    app_commands,
+)
+from discord import __version__ as discord_version
+from discord.abc import GuildChannel
+from discord.ext import commands
+from loguru import logger
+
+from .boot import BootProfile
+from .challenge_index import ChallengeIndex
+from .config import BotMode, Config
+from .database import (
+    JOB_PAGE_SIZE,
+    Challenge,
+    Database,
+    JobKind,
+    JobState,
+    ScheduledJob,
+    Submission,
+)
+from .leader import LeaderElector
+from .messaging import MAX_CHUNK_LENGTH, SendQueue, SolveOutbox, join_chunks
+from .metrics import (
+    CACHE_SIZE,
+    COMMAND_LATENCY,
+    SCHEDULED_EVENTS,
+    WRITER_QUEUE_DEPTH,
+    MetricsServer,
+    http_trace,
+)
+from .resolver import ObjectResolver, UserNameResolver
+from .scheduler import Scheduler
+from .sync import SyncState, command_fingerprint, load_sync_state, save_sync_state
+from .tracing import Tracer
+
+PACKAGE = __name__.rpartition(".")[0]
+
+MAX_JOB_ATTEMPTS = 5
+JOB_RETRY_DELAY = timedelta(seconds=30)
+CATCH_UP_CONCURRENCY = 4
+# Jobs created by other instances are only seen by the leader on the next sweep.
+JOB_SWEEP_INTERVAL = 60
+# Every instance reloads its challenge index this often, whether or not it runs
+# the scheduler, to pick up challenges coming within the horizon.
+INDEX_REFRESH_INTERVAL = 60
+
+
+@dataclass(slots=True)
+class Announcement:
+    challenge: Challenge
+    channel: TextChannel | None
+    mention: str
+    embeds: list[Embed] | None = None
+    solves: list[Submission] = field(default_factory=list)
+    sent: int = 0
+
+
+def start_embed(challenge: Challenge) -> Embed:
+    return Embed(
+        title=f"{challenge.name} has opened!",
+        description=f"""
+{challenge.description}
+
+*Closes at:* <t:{int(challenge.finish.timestamp())}:s>
+Use `/challenge` to view more info and submit the flag.
+""",
+        color=Color.green(),
+        timestamp=challenge.start,
+    )
+
+
+def finish_embeds(challenge: Challenge, solves: Sequence[Submission]) -> list[Embed]:
+    embed = Embed(
+        title=f"{challenge.name} has closed!",
+        description=challenge.description,
+        color=Color.green(),
+        timestamp=challenge.finish,
+    )
+
+    if len(solves) == 0:
+        embed.description = (
+            f"{challenge.description}\n\nNo one managed to solve the challenge!"
+        )
+        return [embed]
+
+    # Long solve lists are split over as many embeds as it takes, each sent as
+    # its own message, starting in a new embed if the description is too long.
+    header = "\n\nThe following players solved the challenge: "
+    footer = "!\n-# In order from first to solve, to last to solve."
+    limit = MAX_CHUNK_LENGTH - len(footer)
+
+    mentions = [f"<@{solve.user_id}>" for solve in solves]
+    embeds: list[Embed] = []
+
+    if len(challenge.description) + len(header) + len(mentions[0]) <= limit:
+        intro = challenge.description + header
+    else:
+        intro = header.lstrip()
+        embeds.append(embed)
+
+    chunks = list(join_chunks(mentions, ", ", limit, limit - len(intro)))
+    chunks[0] = intro + chunks[0]
+
+    if len(embeds) == 0:
+        embed.description = chunks.pop(0)
+        embeds.append(embed)
+
+    for chunk in chunks:
+        embeds.append(Embed(description=chunk, color=Color.green()))
+
+    embeds[-1].description = f"{embeds[-1].description}{footer}"
+    return embeds
+
+
+class ChallengeBot(commands.Bot):
+    config: Config
+    database: Database
+    force_sync: bool
+    profile: BootProfile
+    database_ready: Task[None] | None
+    challenge_index: ChallengeIndex
+    user_names: UserNameResolver
+    objects: ObjectResolver
+    scheduler: Scheduler
+    elector: LeaderElector
+    horizon: timedelta
+    running_jobs: set[int]
+    prepared: dict[tuple[int, JobKind], Announcement | None]
+    send_queue: SendQueue
+    solve_outbox: SolveOutbox
+    refill_task: Task[None] | None
+    index_task: Task[None] | None
+    metrics: MetricsServer | None
+    tracer: Tracer
+
+    def __init__(
+        self,
+        config: Config,
+        database: Database,
+        force_sync: bool = False,
+        profile: BootProfile | None = None,
+    ):
+        self.config = config
+        self.database = database
+        self.force_sync = force_sync
+        self.profile = BootProfile() if profile is None else profile
+        self.database_ready = None
+        self.challenge_index = ChallengeIndex(database)
+        self.scheduler = Scheduler(
+            self.run_job, self.prepare_job, config.announcement_lead_time
+        )
+        self.elector = LeaderElector(
+            database, "scheduler", config.lease_ttl, self.on_elected, self.on_deposed
+        )
+        self.horizon = timedelta(seconds=config.scheduler_horizon)
+        self.running_jobs = set()
+        self.prepared = {}
+        self.send_queue = SendQueue()
+        self.refill_task = None
+        self.index_task = None
+        self.metrics = None
+        self.tracer = Tracer(
+            config.slow_interaction_threshold, config.slow_interaction_sample_rate
+        )
+
+        if config.metrics_port != 0:
+            self.metrics = MetricsServer(config.metrics_host, config.metrics_port)
+
+        logger.info(f"Bot version: {importlib.metadata.version(PACKAGE)}")
+        logger.info(f"Discord.py API version: {discord_version}")
+        logger.info(f"Python version: {python_version()}")
+
+        intents = Intents.default()
+        super().__init__(
+            command_prefix=".",
+            intents=intents,
+            help_command=None,
+            http_trace=http_trace(),
+        )
+
+        self.user_names = UserNameResolver(self)
+        self.objects = ObjectResolver(self)
+        self.solve_outbox = SolveOutbox(self.objects, database, self.send_queue)
+        self.track_metrics()
+
+    def track_metrics(self):
+        SCHEDULED_EVENTS.track(lambda: len(self.scheduler.events), "event")
+        SCHEDULED_EVENTS.track(lambda: len(self.scheduler.prepares), "prepare")
+
+        CACHE_SIZE.track(lambda: len(self.database.server_cache), "servers")
+        CACHE_SIZE.track(lambda: len(self.challenge_index), "challenge_index")
+        CACHE_SIZE.track(lambda: len(self.user_names.cache), "user_names")
+        CACHE_SIZE.track(lambda: len(self.objects.channels), "channels")
+        CACHE_SIZE.track(lambda: len(self.objects.guilds), "guilds")
+        CACHE_SIZE.track(lambda: len(self.objects.roles), "roles")
+        CACHE_SIZE.track(lambda: len(self.prepared), "announcements")
+
+        writer = self.database.writer
+        if writer is not None:
+            WRITER_QUEUE_DEPTH.track(lambda: writer.depth)
+
+    async def login(self, token: str):
+        # The database is prepared while logging in, and only waited on once it's
+        # needed by setup_hook.
+        self.database_ready = get_running_loop().create_task(
+            self.profile.timed("database", self.database.prepare())
+        )
+
+        await self.profile.timed("login and setup", super().login(token))
+
+    async def setup_hook(self):
+        self.tree.on_error = self.on_app_command_error
+        self.tree.interaction_check = self.on_app_command_start
+
+        if self.metrics is not None:
+            await self.metrics.start()
+
+        await gather(
+            self.setup_commands(),
+            self.profile.timed("challenge index", self.load_challenges()),
+        )
+
+        self.index_task = self.loop.create_task(self.refresh_index_loop())
+
+        # Only the instance holding the lease runs the scheduler, so running
+        # several instances against one database doesn't duplicate announcements.
+        self.elector.start()
+
+    async def setup_commands(self):
+        COGS = ["general", "challenges"]
+
+        with self.profile.phase("cogs"):
+            for cog in COGS:
+                await self.load_extension(f"{PACKAGE}.cogs.{cog}")
+                logger.debug(f"Loaded: bot.cogs.{cog}")
+
+        await self.profile.timed("command sync", self.sync_commands())
+
+    async def load_challenges(self):
+        if self.database_ready is not None:
+            await self.database_ready
+
+        challenges = await self.refresh_index()
+
+        # Warm the server cache, since every announcement and command needs it.
+        server_ids = {challenge.server_id for challenge in challenges}
+        await gather(*[self.database.get_server(id) for id in server_ids])
+
+    async def refresh_index(self) -> list[Challenge]:
+        # Challenges starting beyond the horizon are picked up by a later refresh.
+        until = datetime.now(timezone.utc) + self.horizon
+        updates = self.challenge_index.updates
+        upcoming, active = await gather(
+            self.database.get_upcoming_challenges(until),
+            self.database.get_active_challenges(server_id=None),
+        )
+
+        # A challenge changed during the read may have been read as it was
+        # before, so the index is left for the next refresh.
+        challenges = [*upcoming, *active]
+        if self.challenge_index.updates == updates:
+            self.challenge_index.replace(challenges)
+
+        return challenges
+
+    async def refresh_index_loop(self):
+        while True:
+            await sleep(INDEX_REFRESH_INTERVAL)
+
+            try:
+                await self.refresh_index()
+            except Exception as e:
+                logger.error(f"[Index] Refresh failed: {type(e).__name__}: {e}")
+
+    async def sync_commands(self):
+        # Global syncs are slow and heavily rate limited, so they're skipped when
+        # the commands haven't changed since the last one.
+        fingerprint = command_fingerprint(self.tree, self.application_id)
+        state = load_sync_state(self.config.command_sync_file)
+
+        if not self.force_sync and state is not None:
+            if state.fingerprint == fingerprint:
+                logger.info(
+                    f"Slash Commands unchanged, skipped syncing (saved {state.duration:.2f}s)"
+                )
+                return
+
+        started = monotonic()
+        synced = await self.tree.sync()
+        duration = monotonic() - started
+
+        logger.info(f"Synced {len(synced)} Slash Commands globally in {duration:.2f}s.")
+        logger.debug(f"Synced: {[cmd.name for cmd in synced]}")
+
+        save_sync_state(self.config.command_sync_file, SyncState(fingerprint, duration))
+
+    async def close(self):
+        if self.database_ready is not None:
+            self.database_ready.cancel()
+
+        if self.index_task is not None:
+            self.index_task.cancel()
+
+        await self.elector.stop()
+        await self.solve_outbox.close()
+
+        if self.metrics is not None:
+            await self.metrics.stop()
+
+        await super().close()
+
+    async def on_elected(self):
+        overdue = await self.refill_jobs()
+
+        self.scheduler.start()
+        self.refill_task = self.loop.create_task(self.refill_loop(overdue))
+        self.refill_task.add_done_callback(self.on_refill_done)
+
+    async def on_deposed(self):
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+            self.refill_task = None
+
+        await self.scheduler.stop()
+        self.prepared.clear()
+
+    async def on_ready(self):
+        if self.user is None:
+            raise ClientException("Unable to get client's name!")
+        else:
+            logger.success(f"Logged in as {self.user.name}")
+
+        self.profile.report()
+
+    async def on_guild_channel_delete(self, channel: GuildChannel):
+        self.objects.invalidate_channel(channel.id)
+
+    async def on_guild_role_update(self, before: Role, after: Role):
+        self.objects.invalidate_role(after.guild.id, after.id)
+
+    async def on_guild_role_delete(self, role: Role):
+        self.objects.invalidate_role(role.guild.id, role.id)
+
+    async def schedule_jobs(self, challenge: Challenge):
+        jobs = await self.database.replace_jobs(challenge)
+
+        self.cancel_jobs(challenge.id)
+        for job in jobs:
+            self.scheduler.schedule(job.kind, job.challenge_id, job.fire_at)
+
+    def cancel_jobs(self, challenge_id: int):
+        self.scheduler.cancel(challenge_id)
+        self.discard_prepared(challenge_id)
+
+    async def refill_jobs(self) -> list[ScheduledJob]:
+        self.scheduler.until = datetime.now(timezone.utc) + self.horizon
+        return await self.load_jobs()
+
+    # Every pending job within the horizon is read, since jobs written by other
+    # instances can fall anywhere in it.
+    async def load_jobs(self) -> list[ScheduledJob]:
+        now = datetime.now(timezone.utc)
+        overdue: list[ScheduledJob] = []
+        after = None
+
+        while True:
+            jobs = await self.database.get_pending_jobs(self.scheduler.until, after)
+
+            for job in jobs:
+                event = self.scheduler.events.get((job.challenge_id, job.kind))
+
+                if job.fire_at <= now:
+                    overdue.append(job)
+                elif event is None or event.time != job.fire_at:
+                    self.scheduler.schedule(job.kind, job.challenge_id, job.fire_at)
+
+            if len(jobs) < JOB_PAGE_SIZE:
+                return overdue
+
+            after = (jobs[-1].fire_at, jobs[-1].id)
+
+    async def refill_loop(self, overdue: Sequence[ScheduledJob]):
+        refilled_at = monotonic()
+
+        # A failed pass is picked up again by the next sweep, since the jobs are
+        # still pending and the refill is still due.
+        while True:
+            try:
+                if len(overdue) > 0:
+                    logger.info(f"Catching up on {len(overdue)} missed announcements")
+                    await self.drain_jobs(overdue)
+
+            except Exception as e:
+                logger.error(f"[Scheduler] Catching up failed: {type(e).__name__}: {e}")
+
+            await sleep(JOB_SWEEP_INTERVAL)
+
+            try:
+                if monotonic() - refilled_at >= self.horizon.total_seconds() / 2:
+                    overdue = await self.refill_jobs()
+                    refilled_at = monotonic()
+                else:
+                    overdue = await self.load_jobs()
+
+            except Exception as e:
+                logger.error(
+                    f"[Scheduler] Refilling jobs failed: {type(e).__name__}: {e}"
+                )
+                overdue = []
+
+    def on_refill_done(self, task: Task[None]):
+        if task.cancelled() or (error := task.exception()) is None:
+            return
+
+        # Stepping down lets the elector start everything again on its next
+        # heartbeat, rather than holding the lease without refilling.
+        logger.error(
+            f"[Scheduler] Refill loop stopped: {type(error).__name__}: {error}"
+        )
+        self.loop.create_task(self.elector.depose())
+
+    async def drain_jobs(self, jobs: Sequence[ScheduledJob]):
+        # Jobs for the same challenge run in order, so a missed start is always
+        # announced before its missed finish.
+        groups: dict[int, list[ScheduledJob]] = {}
+        for job in jobs:
+            groups.setdefault(job.challenge_id, []).append(job)
+
+        semaphore = Semaphore(CATCH_UP_CONCURRENCY)
+
+        async def drain_group(group: list[ScheduledJob]):
+            async with semaphore:
+                for job in group:
+                    await self.run_job(job.kind, job.challenge_id)
+
+        await gather(*[drain_group(group) for group in groups.values()])
+
+    async def run_job(self, kind: JobKind, challenge_id: int):
+        job = await self.database.get_job(challenge_id, kind)
+        if job is None or job.state != JobState.PENDING or job.id in self.running_jobs:
+            return
+
+        # Another instance may have moved the job later since this event was
+        # scheduled, in which case it waits for its new time.
+        if job.fire_at > datetime.now(timezone.utc):
+            self.scheduler.schedule(kind, challenge_id, job.fire_at)
+            return
+
+        self.running_jobs.add(job.id)
+        announcement = None
+
+        try:
+            if (challenge_id, kind) in self.prepared:
+                announcement = self.prepared.pop((challenge_id, kind))
+            else:
+                announcement = await self.prepare_announcement(kind, challenge_id)
+
+            if kind == JobKind.START:
+                await self.start_event(announcement)
+            else:
+                await self.finish_event(challenge_id, announcement)
+
+        except Exception as e:
+            logger.error(
+                f"[{kind} {challenge_id}] Attempt {job.attempts + 1} failed: {type(e).__name__}: {e}"
+            )
+
+            # Keep what was already sent, so a retry carries on from there.
+            if announcement is not None and announcement.sent > 0:
+                self.prepared[(challenge_id, kind)] = announcement
+
+            retry_at = None
+            if job.attempts + 1 < MAX_JOB_ATTEMPTS:
+                retry_at = (
+                    datetime.now(timezone.utc) + JOB_RETRY_DELAY * 2**job.attempts
+                )
+                self.scheduler.schedule(kind, challenge_id, retry_at)
+
+            await self.database.fail_job(job.id, retry_at)
+
+        else:
+            lag = (datetime.now(timezone.utc) - job.fire_at).total_seconds()
+            logger.debug(f"[{kind} {challenge_id}] Ran {lag:.3f}s after it was due")
+
+            await self.database.complete_job(job.id)
+
+        finally:
+            self.running_jobs.discard(job.id)
+
+    async def prepare_job(self, kind: JobKind, challenge_id: int):
+        # A retry carries on from what the failed attempt already sent, so its
+        # announcement mustn't be replaced with a fresh one.
+        if (challenge_id, kind) in self.prepared:
+            return
+
+        announcement = await self.prepare_announcement(kind, challenge_id)
+        self.prepared.setdefault((challenge_id, kind), announcement)
+
+    def discard_prepared(self, challenge_id: int):
+        for kind in JobKind:
+            self.prepared.pop((challenge_id, kind), None)
+
+    async def prepare_announcement(
+        self, kind: JobKind, challenge_id: int
+    ) -> Announcement | None:
+        challenge = await self.database.get_challenge(challenge_id)
+
+        # The index is brought up to date with the challenge being opened, so
+        # it opens even if the rest of its announcement can't be prepared.
+        if kind == JobKind.START:
+            if challenge is None:
+                self.challenge_index.remove(challenge_id)
+            else:
+                self.challenge_index.put(challenge)
+
+        if challenge is None:
+            return None
+
+        server = await self.database.get_server(challenge.server_id)
+
+        channel = None
+        if server.announcement_channel != 0:
+            channel = await self.objects.channel(server.announcement_channel)
+            assert isinstance(channel, TextChannel)
+
+        announcement = Announcement(
+            challenge=challenge,
+            channel=channel,
+            mention="@everyone" if server.ping_role == 0 else f"<@&{server.ping_role}>",
+        )
+
+        if kind == JobKind.START:
+            announcement.embeds = [start_embed(challenge)]
+        else:
+            announcement.solves = list(await self.database.get_solves(challenge.id))
+
+        return announcement
+
+    async def start_event(self, announcement: Announcement | None):
+        if announcement is None:
+            return
+
+        # A start that was missed entirely isn't worth announcing any more.
+        challenge = announcement.challenge
+        if challenge.finish <= datetime.now(timezone.utc):
+            logger.warning(
+                f"[start {challenge.id}] Skipped the start announcement, since the challenge had already closed"
+                f" (start {challenge.start.isoformat()}, finish {challenge.finish.isoformat()})"
+            )
+            return
+
+        # The index gets the challenge before its announcement is sent, so it
+        # opens even if the announcement can't be sent.
+        self.challenge_index.start(challenge)
+        await self.send_announcement(announcement)
+
+    async def finish_event(self, challenge_id: int, announcement: Announcement | None):
+        self.challenge_index.finish(challenge_id)
+
+        if announcement is None or announcement.channel is None:
+            return
+
+        # Solves keep coming in until the challenge closes, so pick up any made
+        # after the announcement was prepared.
+        if announcement.embeds is None:
+            solves = announcement.solves
+            last_id = max((solve.id for solve in solves), default=0)
+            solves.extend(await self.database.get_solves(challenge_id, last_id))
+
+            announcement.embeds = finish_embeds(announcement.challenge, solves)
+
+        await self.send_announcement(announcement)
+
+    async def send_announcement(self, announcement: Announcement):
+        if announcement.channel is None or announcement.embeds is None:
+            return
+
+        for embed in announcement.embeds[announcement.sent :]:
+            await self.send_queue.send(
+                announcement.channel,
+                announcement.mention if announcement.sent == 0 else None,
+                embed=embed,
+            )
+
+            announcement.sent += 1
+
+    async def on_app_command_start(self, interaction: Interaction) -> bool:
+        interaction.extras["started"] = perf_counter()
+
+        name = "unknown" if interaction.command is None else interaction.command.name
+        self.tracer.start(interaction, name)
+        return True
+
+    async def on_app_command_completion(
+        self,
+        interaction: Interaction,
+        command: app_commands.Command[Any, ..., Any] | app_commands.ContextMenu,
+    ):
+        self.record_command(interaction, "ok")
+
+    async def on_app_command_error(
+        self, interaction: Interaction, error: app_commands.AppCommandError
+    ):
+        try:
+            await handle_error(interaction, error, self.config)
+        finally:
+            self.record_command(interaction, "error")
+
+    def record_command(self, interaction: Interaction, outcome: str):
+        started = interaction.extras.get("started")
+        if started is None or interaction.command is None:
+            return
+
+        COMMAND_LATENCY.observe(
+            perf_counter() - started, interaction.command.name, outcome
+        )
+
+
+async def handle_error(interaction: Interaction, error: Exception, config: Config):
+    async def response_func(*args: Any, **kwargs: Any):
+        # for some reason, just checking interaction.response.is_done does not work
+        # and interaction.followup is in invalid state until a response is sent
+        try:
+            await interaction.response.send_message(*args, **kwargs)
+        except InteractionResponded:
+            await interaction.followup.send(*args, **kwargs)
+
+    if isinstance(error, app_commands.CommandInvokeError):
+        original = error.original
+        err_traceback = error.original.__traceback__
+        error_loc = error.command.name
+
+        if err_traceback is not None:
+            while err_traceback.tb_next is not None:
+                err_traceback = err_traceback.tb_next
+
+            frame = err_traceback.tb_frame
+            while f"src/{PACKAGE}" not in frame.f_code.co_filename.replace("\\", "/"):
+                frame = frame.f_back
+                if frame is None:
+                    break
+
+            if frame is not None:
+                error_loc += f" - {frame.f_code.co_qualname}:{frame.f_lineno}"
+
+        logger.error(f"[{error_loc}] {type(original).__name__}: {original}")
+
+        extra = ""
+        if config.bot_mode == BotMode.DEVELOPMENT:
+            extra = f"\n```{''.join(traceback.format_exception(error.original))}```"
+
+        await response_func(
+            "An unexpected internal error occurred while executing the command" + extra,
+            ephemeral=True,
+        )
+
+    elif isinstance(error, app_commands.CommandOnCooldown):
+        await response_func(
+            "This command is on cooldown, please try again later.", ephemeral=True
+        )
+
+    elif isinstance(error, app_commands.CheckFailure):
+        await response_func(
+            "You don't have permission to use this command.", ephemeral=True
+        )
+
+    else:
+        logger.error(f"[Bot Error] {type(error).__name__}: {error}")
+
+        extra = ""
+        if config.bot_mode == BotMode.DEVELOPMENT:
+            extra = f"\n```{''.join(traceback.format_exception(error))}```"
+
+        await response_func(
+            "An unknown error occurred." + extra,
+            ephemeral=True,
+        )
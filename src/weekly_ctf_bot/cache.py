@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import inf
+from time import monotonic
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class Cache[K, V]:
+    entries: OrderedDict[K, tuple[V, float]]
+    stats: CacheStats
+    max_size: int | None
+    ttl: float | None
+
+    def __init__(self, max_size: int | None = None, ttl: float | None = None):
+        self.entries = OrderedDict()
+        self.stats = CacheStats()
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: K) -> V | None:
+        entry = self.entries.get(key)
+
+        if entry is not None and entry[1] <= monotonic():
+            del self.entries[key]
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        if self.max_size is not None:
+            self.entries.move_to_end(key)
+
+        return entry[0]
+
+    def set(self, key: K, value: V):
+        expiry = inf if self.ttl is None else monotonic() + self.ttl
+        self.entries[key] = (value, expiry)
+
+        if self.max_size is not None:
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: K):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
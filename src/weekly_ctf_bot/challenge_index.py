@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+from typing import Iterable
+
+from .database import Challenge, Database
+
+
+class ChallengeIndex:
+    database: Database
+    active: dict[int, dict[int, Challenge]]
+    upcoming: dict[int, dict[int, Challenge]]
+    servers: dict[int, int]
+    updates: int
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.active = {}
+        self.upcoming = {}
+        self.servers = {}
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    def replace(self, challenges: Iterable[Challenge]):
+        self.active = {}
+        self.upcoming = {}
+        self.servers = {}
+
+        for challenge in challenges:
+            self.put(challenge)
+
+    def put(self, challenge: Challenge):
+        self.remove(challenge.id)
+
+        now = datetime.now(timezone.utc)
+        if not challenge.visible or challenge.finish <= now:
+            return
+
+        bucket = self.active if challenge.start <= now else self.upcoming
+        bucket.setdefault(challenge.server_id, {})[challenge.id] = challenge
+        self.servers[challenge.id] = challenge.server_id
+
+    def remove(self, challenge_id: int):
+        self.updates += 1
+
+        server_id = self.servers.pop(challenge_id, None)
+        if server_id is None:
+            return
+
+        for bucket in (self.active, self.upcoming):
+            if server_id in bucket:
+                bucket[server_id].pop(challenge_id, None)
+
+    async def reload(self, challenge_id: int):
+        challenge = await self.database.get_challenge(challenge_id)
+
+        if challenge is None:
+            self.remove(challenge_id)
+        else:
+            self.put(challenge)
+
+    def start(self, challenge: Challenge):
+        self.remove(challenge.id)
+
+        if not challenge.visible:
+            return
+
+        self.active.setdefault(challenge.server_id, {})[challenge.id] = challenge
+        self.servers[challenge.id] = challenge.server_id
+
+    def finish(self, challenge_id: int):
+        self.remove(challenge_id)
+
+    def get_active(self, server_id: int) -> list[Challenge]:
+        now = datetime.now(timezone.utc)
+        active = self.active.setdefault(server_id, {})
+
+        # Promote anything whose start has passed, in case the scheduler is late.
+        upcoming = self.upcoming.get(server_id, {})
+        for challenge in [chal for chal in upcoming.values() if chal.start <= now]:
+            del upcoming[challenge.id]
+            active[challenge.id] = challenge
+
+        return sorted(
+            [chal for chal in active.values() if chal.start <= now < chal.finish],
+            key=lambda challenge: challenge.start,
+        )
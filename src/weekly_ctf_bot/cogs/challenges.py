@@ -1,10 +1,8 @@
-from datetime import datetime
-
 from discord import Interaction, Member, app_commands
 from discord.ext import commands
 
 from .. import ChallengeBot
-from ..database import Challenge
+from ..database import Challenge, normalize_name
 from ..ui import (
     ChallengeView,
     SubmissionsView,
@@ -18,9 +16,6 @@ from ..ui import (
 
 
 class Challenges(commands.Cog):
-    active_challenges: list[Challenge] = []
-    challenge_cache_time: datetime = datetime(1970, 1, 1)
-
     def __init__(self, client: ChallengeBot):
         self.client = client
 
@@ -114,7 +109,9 @@ class Challenges(commands.Cog):
     @app_commands.checks.cooldown(1, 1)
     async def submissions(self, interaction: Interaction, challenge: str | None):
         async def callback(challenge: Challenge):
-            submissions = await format_submissions(self.client, challenge.id)
+            submissions = await format_submissions(
+                self.client, challenge.id, interaction.guild
+            )
             return SubmissionsView(self.client, challenge, submissions)
 
         challenge_obj = await select_challenge(
@@ -188,12 +185,13 @@ class Challenges(commands.Cog):
     ) -> list[app_commands.Choice[str]]:
         assert interaction.guild_id is not None
 
+        current = normalize_name(current)
         return [
             app_commands.Choice(name=challenge.name, value=challenge.name)
-            for challenge in await self.client.database.get_active_challenges(
+            for challenge in self.client.challenge_index.get_active(
                 interaction.guild_id
             )
-            if current.lower() in challenge.name.lower()
+            if current in challenge.name_key
         ][:25]
 
 
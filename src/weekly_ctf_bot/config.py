@@ -16,6 +16,16 @@ class BotMode(StrEnum):
             raise RuntimeError("Expected bot mode in config, got " + value)
 
 
+def parse_bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
+        return True
+
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+
+    raise RuntimeError("Expected boolean in config, got " + value)
+
+
 @dataclass(frozen=True)
 class Config:
     bot_token: str
@@ -23,6 +33,23 @@ class Config:
     bot_mode: BotMode = field(
         default=BotMode.DEVELOPMENT, metadata={"parser": BotMode.parse}
     )
+    db_pool_size: int = field(default=5)
+    db_max_overflow: int = field(default=10)
+    db_pool_timeout: float = field(default=30)
+    db_pool_recycle: int = field(default=-1)
+    db_pool_pre_ping: bool = field(default=False, metadata={"parser": parse_bool})
+    db_pool_warm: bool = field(default=True, metadata={"parser": parse_bool})
+    db_statement_cache_size: int = field(default=500)
+    db_prepared_statement_cache_size: int = field(default=100)
+    db_slow_query_threshold: float = field(default=0.1)
+    scheduler_horizon: float = field(default=24 * 60 * 60)
+    lease_ttl: float = field(default=15)
+    announcement_lead_time: float = field(default=30)
+    command_sync_file: str = field(default="command_tree.json")
+    metrics_host: str = field(default="127.0.0.1")
+    metrics_port: int = field(default=0)
+    slow_interaction_threshold: float = field(default=1)
+    slow_interaction_sample_rate: float = field(default=0.25)
 
     def __init__(self):
         for cur_field in self.__dataclass_fields__.values():
@@ -1,20 +1,40 @@
+from asyncio import Future, Lock, Queue, Task, gather, get_running_loop, sleep
+from contextlib import AsyncExitStack
+from contextvars import Context, copy_context
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Sequence
+from datetime import datetime, timedelta, timezone
+from enum import StrEnum
+from time import monotonic
+from typing import Any, Awaitable, Callable, Sequence
 from urllib.parse import quote, unquote
 
+from loguru import logger
 from sqlalchemy import (
     BIGINT,
     TEXT,
     VARCHAR,
     Dialect,
+    Enum,
     ForeignKey,
+    Index,
+    Select,
     TypeDecorator,
+    bindparam,
+    case,
     delete,
+    event,
     func,
+    insert,
+    literal,
+    or_,
     select,
+    text,
+    tuple_,
+    type_coerce,
     update,
 )
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
     AsyncEngine,
@@ -22,11 +42,26 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, validates
+from sqlalchemy.pool import QueuePool
+
+from .cache import Cache
+from .config import Config
+from .metrics import DATABASE_LATENCY, WRITER_WAIT, timed_methods
+from .migrations import run_migrations
+from .query_log import QueryLog, caller
 
 MAX_NAME_LENGTH = 32
 MAX_FLAG_LENGTH = 32
 MAX_URL_LENGTH = 64
+JOB_PAGE_SIZE = 500
+# A failed batch of incorrect submissions is kept for this many flushes, and at
+# most this many rows are held back while the database is failing.
+MAX_FLUSH_ATTEMPTS = 5
+MAX_HELD_SUBMISSIONS = 1000
+# Other instances sharing the database can change server settings, which this
+# instance only sees once its cached copy expires.
+SERVER_CACHE_TTL = 60
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -39,6 +74,10 @@ class File:
     url: str
 
 
+def normalize_name(name: str) -> str:
+    return name.strip().casefold()
+
+
 def uri_encode(uri: str) -> str:
     return quote(uri, safe="-_.!~*'();/?:@&=+$,#")
 
@@ -112,9 +151,17 @@ class Server(Base):
 
 class Challenge(Base):
     __tablename__ = "challenge"
+    __table_args__ = (
+        Index("ix_challenge_schedule", "visible", "start", "finish"),
+        Index(
+            "ix_challenge_server_schedule", "server_id", "visible", "start", "finish"
+        ),
+        Index("uq_challenge_server_name", "server_id", "name_key", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(VARCHAR(MAX_NAME_LENGTH), unique=True)
+    name: Mapped[str] = mapped_column(VARCHAR(MAX_NAME_LENGTH))
+    name_key: Mapped[str] = mapped_column(TEXT)
     description: Mapped[str] = mapped_column(TEXT)
     visible: Mapped[bool]
     flag: Mapped[str] = mapped_column(VARCHAR(MAX_FLAG_LENGTH))
@@ -124,9 +171,25 @@ class Challenge(Base):
     finish: Mapped[datetime] = mapped_column(Timestamp)
     server_id: Mapped[int] = mapped_column(ForeignKey("server.id"))
 
+    @validates("name")
+    def validate_name(self, key: str, name: str) -> str:
+        self.name_key = normalize_name(name)
+        return name
+
 
 class Submission(Base):
     __tablename__ = "submission"
+    __table_args__ = (
+        Index("ix_submission_solve", "challenge_id", "user_id", "is_correct"),
+        Index(
+            "uq_submission_solve",
+            "challenge_id",
+            "user_id",
+            unique=True,
+            sqlite_where=text("is_correct"),
+            postgresql_where=text("is_correct"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(BIGINT)
@@ -136,58 +199,545 @@ class Submission(Base):
     challenge_id: Mapped[int] = mapped_column(ForeignKey("challenge.id"))
 
 
+class JobKind(StrEnum):
+    START = "start"
+    FINISH = "finish"
+
+
+class JobState(StrEnum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+
+def enum_values(enum: type[StrEnum]) -> list[str]:
+    return [member.value for member in enum]
+
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_job"
+    __table_args__ = (
+        Index("uq_scheduled_job", "challenge_id", "kind", unique=True),
+        Index("ix_scheduled_job_pending", "state", "fire_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    challenge_id: Mapped[int] = mapped_column(ForeignKey("challenge.id"))
+    kind: Mapped[JobKind] = mapped_column(
+        Enum(JobKind, native_enum=False, length=16, values_callable=enum_values)
+    )
+    fire_at: Mapped[datetime] = mapped_column(Timestamp)
+    state: Mapped[JobState] = mapped_column(
+        Enum(JobState, native_enum=False, length=16, values_callable=enum_values)
+    )
+    attempts: Mapped[int]
+
+
+class Lease(Base):
+    __tablename__ = "lease"
+
+    name: Mapped[str] = mapped_column(VARCHAR(32), primary_key=True)
+    holder: Mapped[str] = mapped_column(VARCHAR(128))
+    expires_at: Mapped[datetime] = mapped_column(Timestamp)
+
+
+class SubmissionResult(StrEnum):
+    ALREADY_SOLVED = "already_solved"
+    CORRECT = "correct"
+    INCORRECT = "incorrect"
+
+
+@dataclass(slots=True)
+class SubmissionSummary:
+    user_id: int
+    attempts: int
+    has_solved: bool
+    first_solve: datetime | None
+
+
+def select_challenge_by_name(server_id: int, name: str) -> Select[tuple[Challenge]]:
+    return (
+        select(Challenge)
+        .where(Challenge.server_id == server_id)
+        .where(Challenge.name_key == normalize_name(name))
+    )
+
+
+def select_active_challenges(
+    server_id: int | None, now: datetime
+) -> Select[tuple[Challenge]]:
+    stmt = (
+        select(Challenge)
+        .where(Challenge.visible)
+        .where(Challenge.start <= now)
+        .where(Challenge.finish > now)
+        .order_by(Challenge.start)
+    )
+
+    if server_id is not None:
+        stmt = stmt.where(Challenge.server_id == server_id)
+
+    return stmt
+
+
+def select_upcoming_challenges(
+    now: datetime, before: datetime
+) -> Select[tuple[Challenge]]:
+    return (
+        select(Challenge)
+        .where(Challenge.visible)
+        .where(Challenge.start > now)
+        .where(Challenge.start < before)
+        .order_by(Challenge.start)
+    )
+
+
+def select_submissions(challenge_id: int) -> Select[tuple[Submission]]:
+    return select(Submission).where(Submission.challenge_id == challenge_id)
+
+
+def select_submission_summaries(challenge_id: int) -> Select[tuple[Any, ...]]:
+    return (
+        select(
+            Submission.user_id,
+            func.count(),
+            func.max(case((Submission.is_correct, 1), else_=0)),
+            type_coerce(
+                func.min(case((Submission.is_correct, Submission.timestamp))),
+                Timestamp,
+            ),
+        )
+        .where(Submission.challenge_id == challenge_id)
+        .group_by(Submission.user_id)
+        .order_by(func.min(Submission.id))
+    )
+
+
+def select_user_submissions(
+    challenge_id: int, user_id: int
+) -> Select[tuple[Submission]]:
+    return (
+        select(Submission)
+        .where(Submission.challenge_id == challenge_id)
+        .where(Submission.user_id == user_id)
+        .order_by(Submission.id)
+    )
+
+
+def select_solve(challenge_id: int, user_id: int) -> Select[tuple[Submission]]:
+    return (
+        select(Submission)
+        .where(Submission.is_correct)
+        .where(Submission.challenge_id == challenge_id)
+        .where(Submission.user_id == user_id)
+    )
+
+
+def select_solves(challenge_id: int, after_id: int) -> Select[tuple[Submission]]:
+    return (
+        select(Submission)
+        .where(Submission.is_correct)
+        .where(Submission.challenge_id == challenge_id)
+        .where(Submission.id > after_id)
+        .order_by(Submission.timestamp, Submission.id)
+    )
+
+
+def select_pending_jobs(
+    before: datetime, after: tuple[datetime, int] | None, limit: int
+) -> Select[tuple[ScheduledJob]]:
+    stmt = (
+        select(ScheduledJob)
+        .where(ScheduledJob.state == JobState.PENDING)
+        .where(ScheduledJob.fire_at < before)
+        .order_by(ScheduledJob.fire_at, ScheduledJob.id)
+        .limit(limit)
+    )
+
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(ScheduledJob.fire_at, ScheduledJob.id)
+            > tuple_(literal(after[0], Timestamp), literal(after[1]))
+        )
+
+    return stmt
+
+
+def select_job(challenge_id: int, kind: JobKind) -> Select[tuple[ScheduledJob]]:
+    return (
+        select(ScheduledJob)
+        .where(ScheduledJob.challenge_id == challenge_id)
+        .where(ScheduledJob.kind == kind)
+    )
+
+
+def set_sqlite_pragmas(dbapi_connection: Any, connection_record: Any):
+    cursor = dbapi_connection.cursor()
+
+    for pragma in [
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "busy_timeout=5000",
+        "temp_store=MEMORY",
+    ]:
+        cursor.execute(f"PRAGMA {pragma}")
+
+    cursor.close()
+
+
+type Write[R] = Callable[[AsyncSession], Awaitable[R]]
+
+
+@dataclass(slots=True)
+class WriterStats:
+    writes: int = 0
+    total_wait: float = 0
+    max_wait: float = 0
+
+
+class SQLiteWriter:
+    session_maker: async_sessionmaker[AsyncSession]
+    queue: Queue[tuple[Write[Any], Future[Any], float, Context]]
+    stats: WriterStats
+    task: Task[None] | None
+
+    def __init__(self, session_maker: async_sessionmaker[AsyncSession]):
+        self.session_maker = session_maker
+        self.queue = Queue()
+        self.stats = WriterStats()
+        self.task = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    async def submit[R](self, write: Write[R]) -> R:
+        loop = get_running_loop()
+        if self.task is None:
+            self.task = loop.create_task(self.run(), context=Context())
+
+        future: Future[R] = loop.create_future()
+        self.queue.put_nowait((write, future, monotonic(), copy_context()))
+        return await future
+
+    async def run(self):
+        loop = get_running_loop()
+
+        while True:
+            write, future, queued_at, context = await self.queue.get()
+
+            wait = monotonic() - queued_at
+            self.stats.writes += 1
+            self.stats.total_wait += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+            WRITER_WAIT.observe(wait)
+
+            try:
+                if not future.done():
+                    # Each write runs in the context it was submitted from, so
+                    # its statements are put down to the method that made it.
+                    result = await loop.create_task(self.apply(write), context=context)
+
+                    if not future.done():
+                        future.set_result(result)
+
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+            finally:
+                self.queue.task_done()
+
+    async def apply[R](self, write: Write[R]) -> R:
+        async with self.session_maker.begin() as session:
+            return await write(session)
+
+    async def close(self):
+        await self.queue.join()
+
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class SubmissionBatcher:
+    database: Database
+    max_size: int
+    max_delay: float
+    rows: list[dict[str, Any]]
+    failures: int
+    lock: Lock
+    timer: Task[None] | None
+
+    def __init__(
+        self,
+        database: Database,
+        max_size: int = 100,
+        max_delay: float = 0.5,
+    ):
+        self.database = database
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.rows = []
+        self.failures = 0
+        self.lock = Lock()
+        self.timer = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, row: dict[str, Any]):
+        self.rows.append(row)
+
+        # Rows held back by a failed flush wait for its retry instead of
+        # flushing again straight away.
+        if len(self.rows) >= self.max_size and self.failures == 0:
+            if self.timer is not None:
+                self.timer.cancel()
+
+            self.timer = self.start_flush(0)
+
+        elif self.timer is None:
+            self.timer = self.start_flush(self.max_delay)
+
+    # A flush writes rows from many interactions, so it runs outside of the
+    # context of whichever one happened to start it.
+    def start_flush(self, delay: float) -> Task[None]:
+        return get_running_loop().create_task(
+            self.flush_later(delay), context=Context()
+        )
+
+    async def flush_later(self, delay: float):
+        await sleep(delay)
+        self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            rows, self.rows = self.rows, []
+            if len(rows) == 0:
+                return
+
+            try:
+                stmt = insert(Submission).values(rows)
+                await self.database.write(lambda session: session.execute(stmt))
+
+            except Exception as e:
+                self.failures += 1
+
+                if self.failures >= MAX_FLUSH_ATTEMPTS:
+                    logger.error(
+                        f"Dropped {len(rows)} submissions after {self.failures} attempts: {type(e).__name__}: {e}"
+                    )
+                    self.failures = 0
+                    return
+
+                # Put the rows back to be retried with the next flush, keeping
+                # the newest if too many have built up.
+                held = rows + self.rows
+                dropped = len(held) - MAX_HELD_SUBMISSIONS
+                self.rows = held[-MAX_HELD_SUBMISSIONS:]
+                logger.warning(
+                    f"Failed to write {len(rows)} submissions, retrying: {type(e).__name__}: {e}"
+                )
+
+                if dropped > 0:
+                    logger.error(f"Dropped {dropped} submissions held back too long")
+
+                if self.timer is None:
+                    self.timer = self.start_flush(self.max_delay)
+
+            else:
+                self.failures = 0
+
+    async def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        await self.flush()
+
+        # Rows that failed to be written have no retry left to wait for.
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if len(self.rows) > 0:
+            logger.error(f"Dropped {len(self.rows)} submissions on close")
+            self.rows = []
+
+
+@timed_methods(DATABASE_LATENCY, caller)
 class Database:
+    config: Config
     engine: AsyncEngine
+    write_engine: AsyncEngine | None
     session_maker: async_sessionmaker[AsyncSession]
+    writer: SQLiteWriter | None
+    server_cache: Cache[int, Server]
+    server_updates: int
+    submission_batcher: SubmissionBatcher
+    query_log: QueryLog
+
+    def __init__(self, config: Config):
+        self.config = config
+
+        url = make_url(config.database_url)
+        is_sqlite = url.get_backend_name() == "sqlite"
+
+        options: dict[str, Any] = {"query_cache_size": config.db_statement_cache_size}
+        pool_options: dict[str, Any] = {
+            "pool_size": config.db_pool_size,
+            "max_overflow": config.db_max_overflow,
+            "pool_timeout": config.db_pool_timeout,
+            "pool_recycle": config.db_pool_recycle,
+            "pool_pre_ping": config.db_pool_pre_ping,
+        }
+
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "prepared_statement_cache_size": config.db_prepared_statement_cache_size
+            }
+
+        self.write_engine = None
+        self.writer = None
+
+        # In-memory SQLite uses a single static connection, so can't be pooled.
+        if is_sqlite and url.database in (None, "", ":memory:"):
+            self.engine = create_async_engine(url, **options)
+
+        # File-backed SQLite only allows one writer at a time, so all writes are
+        # funnelled through a single connection while reads use a small pool.
+        elif is_sqlite:
+            self.engine = create_async_engine(
+                url, **options, **(pool_options | {"max_overflow": 0})
+            )
+
+            self.write_engine = create_async_engine(
+                url, **options, **(pool_options | {"pool_size": 1, "max_overflow": 0})
+            )
+
+            self.writer = SQLiteWriter(
+                async_sessionmaker(self.write_engine, expire_on_commit=False)
+            )
+
+        else:
+            self.engine = create_async_engine(url, **options, **pool_options)
+
+        self.query_log = QueryLog(config.db_slow_query_threshold)
+
+        for engine in [self.engine, self.write_engine]:
+            if engine is None:
+                continue
+
+            self.query_log.attach(engine.sync_engine)
+
+            if is_sqlite:
+                event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
 
-    def __init__(self, url: str):
-        self.engine = create_async_engine(url)
         self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.server_cache = Cache(ttl=SERVER_CACHE_TTL)
+        self.server_updates = 0
+        self.submission_batcher = SubmissionBatcher(self)
 
     @staticmethod
-    async def create(url: str) -> Database:
-        db = Database(url)
+    async def create(config: Config) -> Database:
+        db = Database(config)
+        await db.migrate()
+        return db
 
-        async with db.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+    async def migrate(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(run_migrations, Base.metadata)
 
-        return db
+    async def warm_pool(self):
+        for engine in [self.engine, self.write_engine]:
+            if engine is None or not isinstance(engine.pool, QueuePool):
+                continue
+
+            size = engine.pool.size()
+            async with AsyncExitStack() as stack:
+                await gather(
+                    *[stack.enter_async_context(engine.connect()) for _ in range(size)]
+                )
+
+            logger.debug(f"Warmed {size} database connections")
 
     async def close(self):
+        await self.submission_batcher.close()
+
+        if self.writer is not None:
+            await self.writer.close()
+
+        if self.write_engine is not None:
+            await self.write_engine.dispose()
+
         await self.engine.dispose()
 
-    async def __aenter__(self):
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        self.query_log.report()
+
+    async def prepare(self):
+        await self.migrate()
 
+        if self.config.db_pool_warm:
+            await self.warm_pool()
+
+    async def __aenter__(self):
+        await self.prepare()
         return self
 
     async def __aexit__(self, *exc: Any):
         await self.close()
 
-    async def get_server(self, id: int) -> Server:
+    async def write[R](self, write: Write[R]) -> R:
+        if self.writer is not None:
+            return await self.writer.submit(write)
+
         async with self.session_maker.begin() as session:
-            stmt = select(Server).where(Server.id == id)
+            return await write(session)
+
+    async def get_server(self, id: int) -> Server:
+        server = self.server_cache.get(id)
+        if server is not None:
+            return server
+
+        updates = self.server_updates
+        stmt = select(Server).where(Server.id == id)
+        async with self.session_maker() as session:
             server = (await session.scalars(stmt)).first()
 
-            if server is not None:
+        if server is None:
+
+            async def add_server(session: AsyncSession) -> Server:
+                server = (await session.scalars(stmt)).first()
+                if server is not None:
+                    return server
+
+                server = Server(
+                    id=id,
+                    author_role=0,
+                    ping_role=0,
+                    announcement_channel=0,
+                    solve_channel=0,
+                )
+
+                session.add(server)
                 return server
 
-            server = Server(
-                id=id,
-                author_role=0,
-                ping_role=0,
-                announcement_channel=0,
-                solve_channel=0,
-            )
+            server = await self.write(add_server)
 
-            session.add(server)
-            return server
+        # A server updated during the read may have been read as it was before.
+        if self.server_updates == updates:
+            self.server_cache.set(id, server)
+
+        return server
 
     async def update_server(self, id: int, **kwargs: Any):
-        async with self.session_maker.begin() as session:
-            stmt = update(Server).where(Server.id == id).values(**kwargs)
-            await session.execute(stmt)
+        stmt = update(Server).where(Server.id == id).values(**kwargs)
+        await self.write(lambda session: session.execute(stmt))
+
+        self.server_updates += 1
+        self.server_cache.invalidate(id)
 
     async def get_challenge(self, id: int) -> Challenge | None:
         async with self.session_maker() as session:
@@ -196,91 +746,277 @@ class Database:
 
     async def search_challenge(self, server_id: int, name: str) -> Challenge | None:
         async with self.session_maker() as session:
-            stmt = (
-                select(Challenge)
-                .where(Challenge.server_id == server_id)
-                .where(func.lower(Challenge.name) == func.lower(name))
-            )
-
+            stmt = select_challenge_by_name(server_id, name)
             return (await session.scalars(stmt)).first()
 
     async def get_active_challenges(self, server_id: int | None) -> Sequence[Challenge]:
         async with self.session_maker() as session:
-            now = datetime.now(timezone.utc)
-            stmt = (
-                select(Challenge)
-                .where(Challenge.visible)
-                .where(Challenge.start <= now)
-                .where(Challenge.finish > now)
-                .order_by(Challenge.start)
-            )
-
-            if server_id is not None:
-                stmt = stmt.where(Challenge.server_id == server_id)
-
+            stmt = select_active_challenges(server_id, datetime.now(timezone.utc))
             return (await session.scalars(stmt)).all()
 
-    async def get_upcoming_challenges(self) -> Sequence[Challenge]:
+    async def get_upcoming_challenges(self, before: datetime) -> Sequence[Challenge]:
         async with self.session_maker() as session:
-            now = datetime.now(timezone.utc)
-            stmt = (
-                select(Challenge)
-                .where(Challenge.visible)
-                .where(Challenge.start > now)
-                .order_by(Challenge.start)
-            )
-
+            stmt = select_upcoming_challenges(datetime.now(timezone.utc), before)
             return (await session.scalars(stmt)).all()
 
     async def add_challenge(self, chal: Challenge):
-        async with self.session_maker.begin() as session:
+        async def add(session: AsyncSession):
             session.add(chal)
 
+        await self.write(add)
+
     async def update_challenge(self, id: int, **kwargs: Any):
-        async with self.session_maker.begin() as session:
-            stmt = update(Challenge).where(Challenge.id == id).values(**kwargs)
-            await session.execute(stmt)
+        if "name" in kwargs:
+            kwargs["name_key"] = normalize_name(kwargs["name"])
+
+        stmt = update(Challenge).where(Challenge.id == id).values(**kwargs)
+        await self.write(lambda session: session.execute(stmt))
 
     async def delete_challenge(self, id: int):
-        async with self.session_maker.begin() as session:
-            stmt = delete(Challenge).where(Challenge.id == id)
-            await session.execute(stmt)
+        async def delete_with_jobs(session: AsyncSession):
+            await session.execute(
+                delete(ScheduledJob).where(ScheduledJob.challenge_id == id)
+            )
+            await session.execute(delete(Challenge).where(Challenge.id == id))
+
+        await self.write(delete_with_jobs)
+
+    async def replace_jobs(self, challenge: Challenge) -> list[ScheduledJob]:
+        now = datetime.now(timezone.utc)
+        jobs: list[ScheduledJob] = []
+
+        if challenge.visible:
+            for kind, fire_at in [
+                (JobKind.START, challenge.start),
+                (JobKind.FINISH, challenge.finish),
+            ]:
+                if fire_at > now:
+                    jobs.append(
+                        ScheduledJob(
+                            challenge_id=challenge.id,
+                            kind=kind,
+                            fire_at=fire_at,
+                            state=JobState.PENDING,
+                            attempts=0,
+                        )
+                    )
+
+        async def replace(session: AsyncSession) -> list[ScheduledJob]:
+            await session.execute(
+                delete(ScheduledJob).where(ScheduledJob.challenge_id == challenge.id)
+            )
+
+            session.add_all(jobs)
+            return jobs
+
+        return await self.write(replace)
+
+    async def get_pending_jobs(
+        self,
+        before: datetime,
+        after: tuple[datetime, int] | None = None,
+        limit: int = JOB_PAGE_SIZE,
+    ) -> Sequence[ScheduledJob]:
+        async with self.session_maker() as session:
+            stmt = select_pending_jobs(before, after, limit)
+            return (await session.scalars(stmt)).all()
+
+    async def get_job(self, challenge_id: int, kind: JobKind) -> ScheduledJob | None:
+        async with self.session_maker() as session:
+            stmt = select_job(challenge_id, kind)
+            return (await session.scalars(stmt)).first()
+
+    async def complete_job(self, id: int):
+        stmt = (
+            update(ScheduledJob)
+            .where(ScheduledJob.id == id)
+            .values(state=JobState.DONE, attempts=ScheduledJob.attempts + 1)
+        )
+        await self.write(lambda session: session.execute(stmt))
+
+    async def fail_job(self, id: int, retry_at: datetime | None):
+        values: dict[str, Any] = {"attempts": ScheduledJob.attempts + 1}
+
+        if retry_at is None:
+            values["state"] = JobState.FAILED
+        else:
+            values["fire_at"] = retry_at
+
+        stmt = update(ScheduledJob).where(ScheduledJob.id == id).values(**values)
+        await self.write(lambda session: session.execute(stmt))
 
     async def get_submissions(self, challenge_id: int) -> Sequence[Submission]:
+        await self.submission_batcher.flush()
+
         async with self.session_maker() as session:
-            stmt = select(Submission).where(Submission.challenge_id == challenge_id)
+            stmt = select_submissions(challenge_id)
             return (await session.scalars(stmt)).all()
 
-    async def get_solve(self, challenge_id: int, user_id: int) -> Submission | None:
+    async def get_submission_summaries(
+        self, challenge_id: int
+    ) -> list[SubmissionSummary]:
+        await self.submission_batcher.flush()
+
         async with self.session_maker() as session:
-            stmt = (
-                select(Submission)
-                .where(Submission.is_correct)
-                .where(Submission.challenge_id == challenge_id)
-                .where(Submission.user_id == user_id)
-            )
+            stmt = select_submission_summaries(challenge_id)
+
+            return [
+                SubmissionSummary(
+                    user_id=user_id,
+                    attempts=attempts,
+                    has_solved=bool(has_solved),
+                    first_solve=first_solve,
+                )
+                for user_id, attempts, has_solved, first_solve in await session.execute(
+                    stmt
+                )
+            ]
+
+    async def get_user_submissions(
+        self, challenge_id: int, user_id: int
+    ) -> Sequence[Submission]:
+        await self.submission_batcher.flush()
 
+        async with self.session_maker() as session:
+            stmt = select_user_submissions(challenge_id, user_id)
+            return (await session.scalars(stmt)).all()
+
+    async def get_solve(self, challenge_id: int, user_id: int) -> Submission | None:
+        async with self.session_maker() as session:
+            stmt = select_solve(challenge_id, user_id)
             return (await session.scalars(stmt)).first()
 
-    async def add_submission(
+    async def get_solves(
+        self, challenge_id: int, after_id: int = 0
+    ) -> Sequence[Submission]:
+        async with self.session_maker() as session:
+            stmt = select_solves(challenge_id, after_id)
+            return (await session.scalars(stmt)).all()
+
+    async def submit_flag(
         self, challenge: Challenge, user_id: int, flag: str
-    ) -> bool:
+    ) -> SubmissionResult:
         is_correct = flag.lower() == challenge.flag.lower()
-
-        async with self.session_maker.begin() as session:
-            session.add(
-                Submission(
-                    user_id=user_id,
-                    timestamp=datetime.now(),
-                    flag=flag,
-                    is_correct=is_correct,
-                    challenge_id=challenge.id,
-                )
+        timestamp = datetime.now(timezone.utc)
+
+        # Incorrect attempts are written behind in batches, and since they can't
+        # create a solve they only need to check for an existing one.
+        if not is_correct:
+            if await self.get_solve(challenge.id, user_id) is not None:
+                return SubmissionResult.ALREADY_SOLVED
+
+            self.submission_batcher.add(
+                {
+                    "user_id": user_id,
+                    "timestamp": timestamp,
+                    "flag": flag,
+                    "is_correct": False,
+                    "challenge_id": challenge.id,
+                }
             )
 
-        return is_correct
+            return SubmissionResult.INCORRECT
+
+        # Only record the attempt if the user hasn't already solved the challenge,
+        # and let the partial unique index catch two correct submissions racing.
+        stmt = insert(Submission).from_select(
+            ["user_id", "timestamp", "flag", "is_correct", "challenge_id"],
+            select(
+                literal(user_id, BIGINT),
+                literal(timestamp, Timestamp),
+                bindparam("flag", flag, VARCHAR(MAX_FLAG_LENGTH)),
+                literal(True),
+                literal(challenge.id),
+            ).where(~select_solve(challenge.id, user_id).exists()),
+        )
+
+        try:
+            result = await self.write(lambda session: session.execute(stmt))
+
+        # SQLite doesn't name the index that was violated, so a racing solve is
+        # told apart from any other integrity error by looking for it.
+        except IntegrityError:
+            if await self.get_solve(challenge.id, user_id) is not None:
+                return SubmissionResult.ALREADY_SOLVED
+
+            raise
+
+        if result.rowcount == 0:
+            return SubmissionResult.ALREADY_SOLVED
+
+        return SubmissionResult.CORRECT
 
     async def delete_submission(self, id: int):
-        async with self.session_maker.begin() as session:
-            stmt = delete(Submission).where(Submission.id == id)
-            await session.execute(stmt)
+        stmt = delete(Submission).where(Submission.id == id)
+        await self.write(lambda session: session.execute(stmt))
+
+    async def try_acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=ttl)
+
+        # Renew the lease if it's ours or take it over if it has expired, and
+        # only create it if it doesn't exist yet.
+        stmt = (
+            update(Lease)
+            .where(Lease.name == name)
+            .where(or_(Lease.holder == holder, Lease.expires_at <= now))
+            .values(holder=holder, expires_at=expires_at)
+        )
+
+        async def acquire(session: AsyncSession) -> bool:
+            if (await session.execute(stmt)).rowcount > 0:
+                return True
+
+            await session.execute(
+                insert(Lease).values(name=name, holder=holder, expires_at=expires_at)
+            )
+            return True
+
+        try:
+            return await self.write(acquire)
+
+        except IntegrityError:
+            return False
+
+    async def release_lease(self, name: str, holder: str):
+        stmt = (
+            update(Lease)
+            .where(Lease.name == name)
+            .where(Lease.holder == holder)
+            .values(expires_at=datetime.now(timezone.utc))
+        )
+        await self.write(lambda session: session.execute(stmt))
+
+    async def explain_hot_queries(self) -> dict[str, list[str]]:
+        now = datetime.now(timezone.utc)
+        later = now + timedelta(days=1)
+        queries: dict[str, Select[Any]] = {
+            "get_solve": select_solve(1, 1),
+            "get_submissions": select_submissions(1),
+            "get_submission_summaries": select_submission_summaries(1),
+            "get_user_submissions": select_user_submissions(1, 1),
+            "get_solves": select_solves(1, 0),
+            "get_active_challenges": select_active_challenges(1, now),
+            "get_active_challenges (all servers)": select_active_challenges(None, now),
+            "get_upcoming_challenges": select_upcoming_challenges(now, later),
+            "search_challenge": select_challenge_by_name(1, "name"),
+            "get_pending_jobs": select_pending_jobs(later, (now, 1), JOB_PAGE_SIZE),
+            "get_job": select_job(1, JobKind.START),
+        }
+
+        dialect = self.engine.dialect
+        prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+
+        plans: dict[str, list[str]] = {}
+        async with self.engine.connect() as conn:
+            for name, stmt in queries.items():
+                sql = str(
+                    stmt.compile(
+                        dialect=dialect, compile_kwargs={"literal_binds": True}
+                    )
+                )
+
+                result = await conn.exec_driver_sql(prefix + sql)
+                plans[name] = [str(row[-1]) for row in result]
+
+        return plans
@@ -0,0 +1,86 @@
+import os
+import socket
+from asyncio import Task, get_running_loop, sleep
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from .database import Database
+
+
+def default_holder() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderElector:
+    database: Database
+    name: str
+    holder: str
+    ttl: float
+    on_elected: Callable[[], Awaitable[None]]
+    on_deposed: Callable[[], Awaitable[None]]
+    is_leader: bool
+    task: Task[None] | None
+
+    def __init__(
+        self,
+        database: Database,
+        name: str,
+        ttl: float,
+        on_elected: Callable[[], Awaitable[None]],
+        on_deposed: Callable[[], Awaitable[None]],
+        holder: str | None = None,
+    ):
+        self.database = database
+        self.name = name
+        self.holder = default_holder() if holder is None else holder
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.is_leader = False
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        if self.is_leader:
+            await self.depose()
+            await self.database.release_lease(self.name, self.holder)
+
+    async def run(self):
+        while True:
+            try:
+                acquired = await self.database.try_acquire_lease(
+                    self.name, self.holder, self.ttl
+                )
+
+                if acquired and not self.is_leader:
+                    logger.info(
+                        f"[Leader] {self.holder} acquired the {self.name} lease"
+                    )
+                    self.is_leader = True
+                    await self.on_elected()
+
+                elif not acquired and self.is_leader:
+                    logger.warning(f"[Leader] {self.holder} lost the {self.name} lease")
+                    await self.depose()
+
+            # Step down straight away, since the lease may expire before the
+            # database comes back and another instance takes over.
+            except Exception as e:
+                logger.error(f"[Leader] {type(e).__name__}: {e}")
+
+                if self.is_leader:
+                    await self.depose()
+
+            await sleep(self.ttl / 3)
+
+    async def depose(self):
+        self.is_leader = False
+        await self.on_deposed()
@@ -0,0 +1,169 @@
+from asyncio import Lock, Task, gather, get_running_loop, sleep
+from contextvars import Context
+from dataclasses import dataclass, field
+from math import inf
+from time import monotonic
+from typing import Any, Iterable, Iterator, Sequence
+
+from discord import Message, TextChannel
+from loguru import logger
+
+from .database import Challenge, Database
+from .resolver import ObjectResolver
+
+# Discord allows 4096 characters in an embed description, with some room spare.
+MAX_CHUNK_LENGTH = 4000
+
+# Discord allows 5 messages per 5 seconds in a channel.
+SEND_INTERVAL = 1.0
+
+# Solves landing within this many seconds of each other share one message.
+SOLVE_COALESCE_WINDOW = 2.0
+MAX_NAMED_SOLVERS = 2
+
+
+def join_chunks(
+    parts: Iterable[str],
+    separator: str,
+    limit: int = MAX_CHUNK_LENGTH,
+    first_limit: int | None = None,
+) -> Iterator[str]:
+    chunk = ""
+    chunk_limit = limit if first_limit is None else first_limit
+
+    for part in parts:
+        joined = part if chunk == "" else chunk + separator + part
+
+        if len(joined) > chunk_limit and chunk != "":
+            yield chunk
+            chunk = part
+            chunk_limit = limit
+        else:
+            chunk = joined
+
+    if chunk != "":
+        yield chunk
+
+
+class SendQueue:
+    interval: float
+    locks: dict[int, Lock]
+    last_sent: dict[int, float]
+
+    def __init__(self, interval: float = SEND_INTERVAL):
+        self.interval = interval
+        self.locks = {}
+        self.last_sent = {}
+
+    # Sends to a channel go out one at a time in order, and are spaced out so
+    # that a burst doesn't run into the channel's rate limit.
+    async def send(self, channel: TextChannel, *args: Any, **kwargs: Any) -> Message:
+        async with self.locks.setdefault(channel.id, Lock()):
+            delay = self.last_sent.get(channel.id, -inf) + self.interval - monotonic()
+            if delay > 0:
+                await sleep(delay)
+
+            try:
+                return await channel.send(*args, **kwargs)
+            finally:
+                self.last_sent[channel.id] = monotonic()
+
+
+def format_solvers(user_ids: Sequence[int]) -> str:
+    mentions = [f"<@{user_id}>" for user_id in user_ids]
+
+    if len(mentions) == 1:
+        return mentions[0]
+
+    if len(mentions) <= MAX_NAMED_SOLVERS + 1:
+        return f"{', '.join(mentions[:-1])} and {mentions[-1]}"
+
+    others = len(mentions) - MAX_NAMED_SOLVERS
+    return f"{', '.join(mentions[:MAX_NAMED_SOLVERS])} and {others} others"
+
+
+@dataclass(slots=True)
+class PendingSolves:
+    challenge_name: str
+    user_ids: list[int] = field(default_factory=list)
+
+
+class SolveOutbox:
+    objects: ObjectResolver
+    database: Database
+    send_queue: SendQueue
+    window: float
+    pending: dict[tuple[int, int], PendingSolves]
+    timers: dict[tuple[int, int], Task[None]]
+    tasks: set[Task[None]]
+
+    def __init__(
+        self,
+        objects: ObjectResolver,
+        database: Database,
+        send_queue: SendQueue,
+        window: float = SOLVE_COALESCE_WINDOW,
+    ):
+        self.objects = objects
+        self.database = database
+        self.send_queue = send_queue
+        self.window = window
+        self.pending = {}
+        self.timers = {}
+        self.tasks = set()
+
+    def add(self, server_id: int, challenge: Challenge, user_id: int):
+        key = (server_id, challenge.id)
+
+        if key not in self.pending:
+            self.pending[key] = PendingSolves(challenge.name)
+
+            # The announcement covers solves from many interactions, so it runs
+            # outside of the context of whichever one happened to start it.
+            task = get_running_loop().create_task(
+                self.flush_later(key), context=Context()
+            )
+            self.timers[key] = task
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        self.pending[key].user_ids.append(user_id)
+
+    async def flush_later(self, key: tuple[int, int]):
+        await sleep(self.window)
+
+        # Once sending has started, closing waits for it instead of cancelling.
+        del self.timers[key]
+        await self.flush(key)
+
+    async def flush(self, key: tuple[int, int]):
+        solves = self.pending.pop(key, None)
+        if solves is None:
+            return
+
+        try:
+            server = await self.database.get_server(key[0])
+            if server.solve_channel == 0:
+                return
+
+            channel = await self.objects.channel(server.solve_channel)
+            assert isinstance(channel, TextChannel)
+
+            await self.send_queue.send(
+                channel,
+                f"{format_solvers(solves.user_ids)} just solved {solves.challenge_name}!",
+            )
+
+        except Exception as e:
+            logger.error(
+                f"Dropped {len(solves.user_ids)} solve notifications: {type(e).__name__}: {e}"
+            )
+
+    async def close(self):
+        for task in self.timers.values():
+            task.cancel()
+
+        sending = [task for task in self.tasks if task not in self.timers.values()]
+        self.timers.clear()
+
+        await gather(*[self.flush(key) for key in list(self.pending)], *sending)
@@ -0,0 +1,308 @@
+import re
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import wraps
+from inspect import iscoroutinefunction
+from math import inf
+from time import perf_counter
+from types import FunctionType, SimpleNamespace
+from typing import Any, Callable, Iterator
+
+from aiohttp import (
+    ClientSession,
+    TraceConfig,
+    TraceRequestEndParams,
+    TraceRequestExceptionParams,
+    TraceRequestStartParams,
+    web,
+)
+from loguru import logger
+
+from .tracing import record_span
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# IDs and tokens in REST paths are collapsed, so each route is one series.
+PATH_PARAMETER = re.compile(r"/(?:\d+|[\w-]{32,})(?=/|$)")
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if len(names) == 0:
+        return ""
+
+    pairs = []
+    for name, value in zip(names, values):
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+@dataclass(slots=True)
+class Series:
+    counts: list[int]
+    sum: float = 0
+    count: int = 0
+
+
+class Histogram:
+    name: str
+    description: str
+    labels: tuple[str, ...]
+    buckets: tuple[float, ...]
+    series: dict[tuple[str, ...], Series]
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+        METRICS.append(self)
+
+    # Recording is a dict lookup and a bisect, and everything else is left for
+    # when the metrics are scraped.
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = Series([0] * (len(self.buckets) + 1))
+
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+
+        for labels, series in self.series.items():
+            total = 0
+            for bound, count in zip([*self.buckets, inf], series.counts):
+                total += count
+                le = format_labels(
+                    (*self.labels, "le"),
+                    (*labels, "+Inf" if bound == inf else str(bound)),
+                )
+                yield f"{self.name}_bucket{le} {total}"
+
+            names = format_labels(self.labels, labels)
+            yield f"{self.name}_sum{names} {series.sum}"
+            yield f"{self.name}_count{names} {series.count}"
+
+
+class Gauge:
+    name: str
+    description: str
+    labels: tuple[str, ...]
+    sources: dict[tuple[str, ...], Callable[[], float]]
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.sources = {}
+
+        METRICS.append(self)
+
+    # Gauges are read from their source when scraped, so keeping them up to
+    # date costs nothing.
+    def track(self, source: Callable[[], float], *labels: str):
+        self.sources[labels] = source
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} gauge"
+
+        for labels, source in self.sources.items():
+            yield f"{self.name}{format_labels(self.labels, labels)} {source()}"
+
+
+METRICS: list[Histogram | Gauge] = []
+
+COMMAND_LATENCY = Histogram(
+    "command_latency_seconds",
+    "Time taken to handle each slash command.",
+    ("command", "outcome"),
+)
+DATABASE_LATENCY = Histogram(
+    "database_latency_seconds",
+    "Time taken by each database method.",
+    ("method",),
+)
+REST_LATENCY = Histogram(
+    "discord_rest_latency_seconds",
+    "Time taken by each Discord REST request.",
+    ("method", "route", "status"),
+)
+RATE_LIMIT_WAIT = Histogram(
+    "discord_rate_limit_wait_seconds",
+    "Time Discord asked the bot to wait before its next request.",
+    ("reason", "scope"),
+)
+WRITER_WAIT = Histogram(
+    "database_writer_wait_seconds",
+    "Time each write waited in the SQLite writer's queue.",
+)
+SCHEDULER_LAG = Histogram(
+    "scheduler_lag_seconds",
+    "How late each scheduled event fired.",
+)
+SCHEDULED_EVENTS = Gauge(
+    "scheduler_pending_events",
+    "Events waiting in the scheduler.",
+    ("type",),
+)
+WRITER_QUEUE_DEPTH = Gauge(
+    "database_writer_queue_depth",
+    "Writes waiting in the SQLite writer's queue.",
+)
+CACHE_SIZE = Gauge(
+    "cache_size",
+    "Entries held in each cache.",
+    ("cache",),
+)
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+def timed_methods[T: type](
+    histogram: Histogram, caller: ContextVar[str | None] | None = None
+) -> Callable[[T], T]:
+    def wrap(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            started = perf_counter()
+
+            # Only the outermost method is kept, since methods called from it
+            # are doing its work.
+            token = None
+            if caller is not None and caller.get() is None:
+                token = caller.set(method.__name__)
+
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                duration = perf_counter() - started
+                histogram.observe(duration, method.__name__)
+
+                if token is not None:
+                    caller.reset(token)
+                    record_span(f"db {method.__name__}", duration)
+
+        return timed
+
+    def decorate(cls: T) -> T:
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, FunctionType) and iscoroutinefunction(value):
+                if not name.startswith("_"):
+                    setattr(cls, name, wrap(value))
+
+        return cls
+
+    return decorate
+
+
+async def on_request_start(
+    session: ClientSession, context: SimpleNamespace, params: TraceRequestStartParams
+):
+    context.started = perf_counter()
+
+
+async def on_request_end(
+    session: ClientSession, context: SimpleNamespace, params: TraceRequestEndParams
+):
+    route = PATH_PARAMETER.sub("/{id}", params.url.path)
+    status = params.response.status
+    duration = perf_counter() - context.started
+
+    REST_LATENCY.observe(duration, params.method, route, str(status))
+    record_span(f"{params.method} {route}", duration)
+
+    headers = params.response.headers
+    scope = headers.get("X-RateLimit-Scope", "user")
+
+    if status == 429 and "Retry-After" in headers:
+        RATE_LIMIT_WAIT.observe(float(headers["Retry-After"]), "429", scope)
+
+    # discord.py holds back further requests to an exhausted bucket until it
+    # resets, without going over the wire.
+    elif headers.get("X-RateLimit-Remaining") == "0":
+        reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+        RATE_LIMIT_WAIT.observe(reset_after, "exhausted", scope)
+
+
+async def on_request_exception(
+    session: ClientSession,
+    context: SimpleNamespace,
+    params: TraceRequestExceptionParams,
+):
+    route = PATH_PARAMETER.sub("/{id}", params.url.path)
+    duration = perf_counter() - context.started
+
+    REST_LATENCY.observe(duration, params.method, route, "error")
+    record_span(f"{params.method} {route}", duration)
+
+
+def http_trace() -> TraceConfig:
+    trace = TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+
+class MetricsServer:
+    host: str
+    port: int
+    runner: web.AppRunner | None
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=render_metrics().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
@@ -0,0 +1,283 @@
+from time import time
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import (
+    CheckConstraint,
+    Column,
+    Connection,
+    Integer,
+    MetaData,
+    Table,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+
+type Migration = Callable[[Connection], None]
+
+# Any constant works, as long as nothing else sharing the database takes the
+# same advisory lock.
+MIGRATION_LOCK_KEY = 0x57435446
+
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("id", Integer, CheckConstraint("id = 1"), primary_key=True, default=1),
+    Column("version", Integer, nullable=False),
+)
+
+
+def add_hot_query_indexes(conn: Connection):
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_submission_solve"
+        " ON submission (challenge_id, user_id, is_correct)",
+        "CREATE INDEX IF NOT EXISTS ix_challenge_schedule"
+        " ON challenge (visible, start, finish)",
+        "CREATE INDEX IF NOT EXISTS ix_challenge_server_schedule"
+        " ON challenge (server_id, visible, start, finish)",
+        "CREATE INDEX IF NOT EXISTS ix_challenge_server_name"
+        " ON challenge (server_id, lower(name))",
+    ]:
+        conn.execute(text(statement))
+
+
+def add_challenge_name_key(conn: Connection):
+    # SQLite can't drop the old global UNIQUE (name) constraint, so the table is
+    # rebuilt without it.
+    if conn.dialect.name == "sqlite":
+        for index in ["ix_challenge_schedule", "ix_challenge_server_schedule"]:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+        conn.execute(
+            text("""
+CREATE TABLE challenge_new (
+    id INTEGER NOT NULL,
+    name VARCHAR(32) NOT NULL,
+    name_key TEXT NOT NULL,
+    description TEXT NOT NULL,
+    visible BOOLEAN NOT NULL,
+    flag VARCHAR(32) NOT NULL,
+    files TEXT NOT NULL,
+    url VARCHAR(64) NOT NULL,
+    start BIGINT NOT NULL,
+    finish BIGINT NOT NULL,
+    server_id BIGINT NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(server_id) REFERENCES server (id)
+)""")
+        )
+
+        conn.execute(
+            text("""
+INSERT INTO challenge_new
+SELECT id, name, '', description, visible, flag, files, url, start, finish, server_id
+FROM challenge""")
+        )
+
+        conn.execute(text("DROP TABLE challenge"))
+        conn.execute(text("ALTER TABLE challenge_new RENAME TO challenge"))
+
+        conn.execute(
+            text(
+                "CREATE INDEX ix_challenge_schedule ON challenge (visible, start, finish)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE INDEX ix_challenge_server_schedule"
+                " ON challenge (server_id, visible, start, finish)"
+            )
+        )
+
+    else:
+        conn.execute(
+            text("ALTER TABLE challenge ADD COLUMN name_key TEXT NOT NULL DEFAULT ''")
+        )
+        conn.execute(text("ALTER TABLE challenge ALTER COLUMN name_key DROP DEFAULT"))
+        conn.execute(text("ALTER TABLE challenge DROP CONSTRAINT challenge_name_key"))
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_challenge_server_name"))
+
+    seen: set[tuple[int, str]] = set()
+    rows = conn.execute(text("SELECT id, server_id, name FROM challenge ORDER BY id"))
+
+    for id, server_id, name in rows.all():
+        name_key = name.strip().casefold()
+
+        # Names were only unique case-sensitively before, so rename any clashes.
+        if (server_id, name_key) in seen:
+            suffix = f"-{id}"
+            new_name = name[: 32 - len(suffix)] + suffix
+            logger.warning(f"Renaming challenge {id} from {name!r} to {new_name!r}")
+
+            name, name_key = new_name, new_name.strip().casefold()
+
+        seen.add((server_id, name_key))
+        conn.execute(
+            text(
+                "UPDATE challenge SET name = :name, name_key = :name_key WHERE id = :id"
+            ),
+            {"id": id, "name": name, "name_key": name_key},
+        )
+
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX uq_challenge_server_name ON challenge (server_id, name_key)"
+        )
+    )
+
+
+def add_unique_solve_index(conn: Connection):
+    # Keep the first solve of any user who managed to solve a challenge twice.
+    result = conn.execute(
+        text("""
+UPDATE submission SET is_correct = FALSE
+WHERE is_correct AND id NOT IN (
+    SELECT min(id) FROM submission WHERE is_correct GROUP BY challenge_id, user_id
+)""")
+    )
+
+    if result.rowcount > 0:
+        logger.warning(f"Marked {result.rowcount} duplicate solves as incorrect")
+
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX uq_submission_solve"
+            " ON submission (challenge_id, user_id) WHERE is_correct"
+        )
+    )
+
+
+def add_scheduled_jobs(conn: Connection):
+    id_column = "id INTEGER NOT NULL" if conn.dialect.name == "sqlite" else "id SERIAL"
+
+    conn.execute(
+        text(f"""
+CREATE TABLE scheduled_job (
+    {id_column},
+    challenge_id INTEGER NOT NULL,
+    kind VARCHAR(16) NOT NULL,
+    fire_at BIGINT NOT NULL,
+    state VARCHAR(16) NOT NULL,
+    attempts INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(challenge_id) REFERENCES challenge (id)
+)""")
+    )
+
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX uq_scheduled_job ON scheduled_job (challenge_id, kind)"
+        )
+    )
+    conn.execute(
+        text("CREATE INDEX ix_scheduled_job_pending ON scheduled_job (state, fire_at)")
+    )
+
+    # Only announcements still in the future can be recovered, anything already
+    # missed before this migration is lost.
+    now = int(time() * 1000)
+    for kind, column in [("start", "start"), ("finish", "finish")]:
+        conn.execute(
+            text(f"""
+INSERT INTO scheduled_job (challenge_id, kind, fire_at, state, attempts)
+SELECT id, '{kind}', {column}, 'pending', 0
+FROM challenge
+WHERE visible AND {column} > :now"""),
+            {"now": now},
+        )
+
+
+def add_leases(conn: Connection):
+    conn.execute(
+        text("""
+CREATE TABLE lease (
+    name VARCHAR(32) NOT NULL,
+    holder VARCHAR(128) NOT NULL,
+    expires_at BIGINT NOT NULL,
+    PRIMARY KEY (name)
+)""")
+    )
+
+
+def add_schema_version_key(conn: Connection):
+    # Instances racing to initialise the database could each insert a version,
+    # so only the latest is kept.
+    conn.execute(
+        text("""
+CREATE TABLE schema_version_new (
+    id INTEGER NOT NULL DEFAULT 1,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (id),
+    CHECK (id = 1)
+)""")
+    )
+
+    conn.execute(
+        text(
+            "INSERT INTO schema_version_new (id, version)"
+            " SELECT 1, max(version) FROM schema_version"
+        )
+    )
+
+    conn.execute(text("DROP TABLE schema_version"))
+    conn.execute(text("ALTER TABLE schema_version_new RENAME TO schema_version"))
+
+
+def lock_migrations(conn: Connection):
+    # Instances starting together would otherwise all read the same version and
+    # run the same migrations. SQLite has no advisory locks, but taking its write
+    # lock up front has the same effect.
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        )
+
+
+# Schema version 1 is the schema created before migrations existed, and
+# `MIGRATIONS[i]` upgrades the schema from version `i + 1` to `i + 2`.
+MIGRATIONS: list[Migration] = [
+    add_hot_query_indexes,
+    add_challenge_name_key,
+    add_unique_solve_index,
+    add_scheduled_jobs,
+    add_leases,
+    add_schema_version_key,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS) + 1
+
+
+def run_migrations(conn: Connection, metadata: MetaData):
+    lock_migrations(conn)
+
+    version_metadata.create_all(conn)
+    version = conn.scalar(select(schema_version.c.version))
+
+    if version is None:
+        if inspect(conn).has_table("challenge"):
+            version = 1
+        else:
+            metadata.create_all(conn)
+            version = SCHEMA_VERSION
+
+        conn.execute(insert(schema_version).values(version=version))
+        logger.info(f"Initialised database at schema version {version}")
+
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than supported version {SCHEMA_VERSION}"
+        )
+
+    for migration in MIGRATIONS[version - 1 :]:
+        version += 1
+        logger.info(f"Migrating database to schema version {version}")
+
+        migration(conn)
+        conn.execute(update(schema_version).values(version=version))
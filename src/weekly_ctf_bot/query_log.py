@@ -0,0 +1,113 @@
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExecutionContext
+
+# The outermost Database method running in the current context, which any
+# statements it makes are put down to.
+caller: ContextVar[str | None] = ContextVar("caller", default=None)
+
+REDACTED_PARAMETER = re.compile(r"^flag(_.*)?$")
+
+
+def flatten(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+@dataclass(slots=True)
+class QueryStats:
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    callers: set[str] = field(default_factory=set)
+
+
+def redact_parameters(context: ExecutionContext | None, parameters: Any) -> Any:
+    # Compiled statements still have their parameter names, so flags can be
+    # found and hidden, but raw SQL only has its values.
+    if context is None or context.compiled is None:
+        return parameters
+
+    redacted = [
+        {
+            name: "<redacted>" if REDACTED_PARAMETER.match(name) else value
+            for name, value in compiled.items()
+        }
+        for compiled in context.compiled_parameters
+    ]
+
+    return redacted[0] if len(redacted) == 1 else redacted
+
+
+class QueryLog:
+    threshold: float
+    stats: dict[str, QueryStats]
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.stats = {}
+
+    def attach(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+
+    def before_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext | None,
+        executemany: bool,
+    ):
+        conn.info.setdefault("query_started", []).append(perf_counter())
+
+    def after_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext | None,
+        executemany: bool,
+    ):
+        duration = perf_counter() - conn.info["query_started"].pop()
+        method = caller.get() or "unknown"
+
+        stats = self.stats.get(statement)
+        if stats is None:
+            stats = self.stats[statement] = QueryStats()
+
+        stats.count += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+        stats.callers.add(method)
+
+        if duration >= self.threshold:
+            logger.warning(
+                f"[{method}] Slow query took {duration * 1000:.1f}ms: {flatten(statement)} {redact_parameters(context, parameters)}"
+            )
+
+    def hottest(self, limit: int = 10) -> list[tuple[str, QueryStats]]:
+        by_total = sorted(
+            self.stats.items(), key=lambda item: item[1].total, reverse=True
+        )
+        return by_total[:limit]
+
+    def report(self, limit: int = 10):
+        if len(self.stats) == 0:
+            return
+
+        lines = ["Hottest queries by total time:"]
+        for statement, stats in self.hottest(limit):
+            lines.append(
+                f"    {stats.total * 1000:9.1f}ms over {stats.count:6} calls (max {stats.max * 1000:.1f}ms)"
+                f" from {', '.join(sorted(stats.callers))}: {flatten(statement)}"
+            )
+
+        logger.info("\n".join(lines))
@@ -0,0 +1,126 @@
+from asyncio import Semaphore, gather
+from typing import Iterable
+
+from discord import Client, Guild, NotFound, Role, Thread
+from discord.abc import GuildChannel, PrivateChannel
+
+from .cache import Cache, CacheStats
+
+type Channel = GuildChannel | Thread | PrivateChannel
+
+
+class UserNameResolver:
+    client: Client
+    cache: Cache[int, str]
+    semaphore: Semaphore
+
+    def __init__(
+        self,
+        client: Client,
+        max_size: int = 4096,
+        ttl: float = 60 * 60,
+        concurrency: int = 8,
+    ):
+        self.client = client
+        self.cache = Cache(max_size=max_size, ttl=ttl)
+        self.semaphore = Semaphore(concurrency)
+
+    def get(self, user_id: int, guild: Guild | None = None) -> str | None:
+        member = None if guild is None else guild.get_member(user_id)
+        if member is not None:
+            return member.display_name
+
+        user = self.client.get_user(user_id)
+        if user is not None:
+            return user.display_name
+
+        return self.cache.get(user_id)
+
+    async def fetch(self, user_id: int) -> str:
+        async with self.semaphore:
+            try:
+                name = (await self.client.fetch_user(user_id)).display_name
+            except NotFound:
+                name = str(user_id)
+
+        self.cache.set(user_id, name)
+        return name
+
+    async def resolve(
+        self, user_ids: Iterable[int], guild: Guild | None = None
+    ) -> dict[int, str]:
+        names: dict[int, str] = {}
+        missing: list[int] = []
+
+        for user_id in user_ids:
+            name = self.get(user_id, guild)
+
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if len(missing) > 0:
+            fetched = await gather(*[self.fetch(user_id) for user_id in missing])
+            names.update(zip(missing, fetched))
+
+        return names
+
+
+class ObjectResolver:
+    client: Client
+    channels: Cache[int, Channel]
+    guilds: Cache[int, Guild]
+    roles: Cache[tuple[int, int], Role]
+    stats: CacheStats
+
+    # Objects the gateway already holds are used as is, and anything fetched
+    # over REST is cached for a while since the gateway won't keep it updated.
+    def __init__(self, client: Client, max_size: int = 1024, ttl: float = 5 * 60):
+        self.client = client
+        self.channels = Cache(max_size=max_size, ttl=ttl)
+        self.guilds = Cache(max_size=max_size, ttl=ttl)
+        self.roles = Cache(max_size=max_size, ttl=ttl)
+        self.stats = CacheStats()
+
+    async def channel(self, channel_id: int) -> Channel:
+        channel = self.client.get_channel(channel_id) or self.channels.get(channel_id)
+
+        if channel is None:
+            self.stats.misses += 1
+            channel = await self.client.fetch_channel(channel_id)
+            self.channels.set(channel_id, channel)
+        else:
+            self.stats.hits += 1
+
+        return channel
+
+    async def guild(self, guild_id: int) -> Guild:
+        guild = self.client.get_guild(guild_id) or self.guilds.get(guild_id)
+
+        if guild is None:
+            self.stats.misses += 1
+            guild = await self.client.fetch_guild(guild_id)
+            self.guilds.set(guild_id, guild)
+        else:
+            self.stats.hits += 1
+
+        return guild
+
+    async def role(self, guild: Guild, role_id: int) -> Role:
+        role = guild.get_role(role_id) or self.roles.get((guild.id, role_id))
+
+        if role is None:
+            self.stats.misses += 1
+            role = await guild.fetch_role(role_id)
+            self.roles.set((guild.id, role_id), role)
+        else:
+            self.stats.hits += 1
+
+        return role
+
+    def invalidate_channel(self, channel_id: int):
+        self.channels.invalidate(channel_id)
+
+    def invalidate_role(self, guild_id: int, role_id: int):
+        self.roles.invalidate((guild_id, role_id))
@@ -0,0 +1,180 @@
+from asyncio import Event, Task, get_running_loop, wait_for
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from .database import JobKind
+from .metrics import SCHEDULER_LAG
+
+# Long sleeps are split up so that wall clock changes are noticed in time.
+MAX_SLEEP = 60.0
+
+type Handler = Callable[[JobKind, int], Awaitable[None]]
+
+
+@dataclass(order=True, slots=True)
+class ScheduledEvent:
+    time: datetime
+    sequence: int
+    kind: JobKind = field(compare=False)
+    challenge_id: int = field(compare=False)
+    prepare: bool = field(default=False, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+@dataclass(slots=True)
+class SchedulerStats:
+    fired: int = 0
+    total_lag: float = 0
+    max_lag: float = 0
+
+
+class Scheduler:
+    handler: Handler
+    preparer: Handler | None
+    lead_time: timedelta
+    heap: list[ScheduledEvent]
+    events: dict[tuple[int, JobKind], ScheduledEvent]
+    prepares: dict[tuple[int, JobKind], ScheduledEvent]
+    stats: SchedulerStats
+    sequence: count[int]
+    wakeup: Event
+    task: Task[None] | None
+    running: set[Task[None]]
+    # Events from here onwards are left in the database until the next refill.
+    until: datetime
+
+    def __init__(
+        self,
+        handler: Handler,
+        preparer: Handler | None = None,
+        lead_time: float = 0,
+    ):
+        self.handler = handler
+        self.preparer = preparer
+        self.lead_time = timedelta(seconds=lead_time)
+        self.heap = []
+        self.events = {}
+        self.prepares = {}
+        self.stats = SchedulerStats()
+        self.sequence = count()
+        self.wakeup = Event()
+        self.task = None
+        self.running = set()
+        self.until = datetime.min.replace(tzinfo=timezone.utc)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def schedule(self, kind: JobKind, challenge_id: int, time: datetime):
+        self.cancel(challenge_id, kind)
+        if time >= self.until:
+            return
+
+        event = ScheduledEvent(time, next(self.sequence), kind, challenge_id)
+        self.events[(challenge_id, kind)] = event
+        self.push(event)
+
+        # Work that can be done ahead of time is given a head start, so that
+        # only the time critical part is left for the event itself.
+        if self.preparer is not None:
+            prepare = ScheduledEvent(
+                time - self.lead_time,
+                next(self.sequence),
+                kind,
+                challenge_id,
+                prepare=True,
+            )
+
+            self.prepares[(challenge_id, kind)] = prepare
+            self.push(prepare)
+
+    def push(self, event: ScheduledEvent):
+        heappush(self.heap, event)
+
+        if self.heap[0] is event:
+            self.wakeup.set()
+
+    def cancel(self, challenge_id: int, kind: JobKind | None = None):
+        for event_kind in JobKind if kind is None else [kind]:
+            for events in (self.events, self.prepares):
+                event = events.pop((challenge_id, event_kind), None)
+                if event is not None:
+                    event.cancelled = True
+
+        # Cancelled events are left in the heap until popped, unless they pile up.
+        if len(self.heap) > 2 * (len(self.events) + len(self.prepares)) + 64:
+            self.heap = [event for event in self.heap if not event.cancelled]
+            heapify(self.heap)
+
+    def start(self):
+        if self.task is None:
+            self.task = get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        for task in self.running:
+            task.cancel()
+
+        self.heap = []
+        self.events = {}
+        self.prepares = {}
+        self.until = datetime.min.replace(tzinfo=timezone.utc)
+
+    async def run(self):
+        while True:
+            while len(self.heap) > 0 and self.heap[0].cancelled:
+                heappop(self.heap)
+
+            self.wakeup.clear()
+
+            if len(self.heap) == 0:
+                await self.wakeup.wait()
+                continue
+
+            now = datetime.now(timezone.utc)
+            delay = (self.heap[0].time - now).total_seconds()
+            if delay > 0:
+                try:
+                    await wait_for(self.wakeup.wait(), min(delay, MAX_SLEEP))
+                except TimeoutError:
+                    pass
+
+                continue
+
+            event = heappop(self.heap)
+
+            if event.prepare:
+                del self.prepares[(event.challenge_id, event.kind)]
+                assert self.preparer is not None
+                handler = self.preparer
+
+            else:
+                del self.events[(event.challenge_id, event.kind)]
+                handler = self.handler
+
+                lag = (now - event.time).total_seconds()
+                self.stats.fired += 1
+                self.stats.total_lag += lag
+                self.stats.max_lag = max(self.stats.max_lag, lag)
+                SCHEDULER_LAG.observe(lag)
+
+            task = get_running_loop().create_task(
+                handler(event.kind, event.challenge_id)
+            )
+
+            self.running.add(task)
+            task.add_done_callback(self.on_done)
+
+    def on_done(self, task: Task[None]):
+        self.running.discard(task)
+
+        if not task.cancelled() and (error := task.exception()) is not None:
+            logger.error(f"[Scheduler] {type(error).__name__}: {error}")
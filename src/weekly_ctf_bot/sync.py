@@ -0,0 +1,46 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from discord import app_commands
+from loguru import logger
+
+
+@dataclass(slots=True)
+class SyncState:
+    fingerprint: str
+    duration: float
+
+
+def command_fingerprint(
+    tree: app_commands.CommandTree[Any], application_id: int | None
+) -> str:
+    payload = {
+        "application_id": application_id,
+        "commands": sorted(
+            [command.to_dict(tree) for command in tree.get_commands()],
+            key=lambda command: (command["name"], command.get("type", 1)),
+        ),
+    }
+
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def load_sync_state(path: str) -> SyncState | None:
+    try:
+        with open(path) as file:
+            return SyncState(**json.load(file))
+
+    except FileNotFoundError:
+        return None
+
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring invalid command sync state in {path}: {e}")
+        return None
+
+
+def save_sync_state(path: str, state: SyncState):
+    with open(path, "w") as file:
+        json.dump(asdict(state), file)
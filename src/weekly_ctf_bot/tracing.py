@@ -0,0 +1,100 @@
+from asyncio import Task, current_task
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from random import random
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from discord import Interaction
+    from loguru import Record
+
+# Spans past this are dropped, so one runaway interaction can't hold on to an
+# unbounded amount of memory.
+MAX_SPANS = 256
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    start: float
+    duration: float
+
+
+@dataclass(slots=True)
+class Trace:
+    id: str
+    name: str
+    started: float
+    spans: list[Span] = field(default_factory=list)
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, duration: float):
+    trace = current_trace.get()
+
+    if trace is not None and len(trace.spans) < MAX_SPANS:
+        end = perf_counter() - trace.started
+        trace.spans.append(Span(name, end - duration, duration))
+
+
+def add_trace_id(record: Record):
+    trace = current_trace.get()
+    record["extra"]["trace_id"] = "-" if trace is None else trace.id
+
+
+class Tracer:
+    slow_threshold: float
+    sample_rate: float
+
+    def __init__(self, slow_threshold: float, sample_rate: float):
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+
+    # discord.py handles each interaction in its own task, so the trace lasts
+    # until that task is done and doesn't leak into other interactions.
+    def start(self, interaction: Interaction, name: str) -> Trace:
+        trace = Trace(str(interaction.id), name, perf_counter())
+        current_trace.set(trace)
+
+        task = current_task()
+        if task is not None:
+            task.add_done_callback(lambda task: self.finish(trace, task))
+
+        return trace
+
+    def finish(self, trace: Trace, task: Task[Any]):
+        duration = perf_counter() - trace.started
+        if duration < self.slow_threshold or random() >= self.sample_rate:
+            return
+
+        totals: dict[str, list[float]] = {}
+        for span in trace.spans:
+            total = totals.setdefault(span.name, [0, 0])
+            total[0] += 1
+            total[1] += span.duration
+
+        # Spans can overlap, so whatever isn't covered by them is only a rough
+        # idea of the time spent in the bot itself.
+        breakdown = [
+            {"name": name, "count": int(count), "duration": round(total, 4)}
+            for name, (count, total) in sorted(
+                totals.items(), key=lambda item: item[1][1], reverse=True
+            )
+        ]
+        untracked = duration - sum(span.duration for span in trace.spans)
+
+        lines = [f"Slow interaction {trace.name} took {duration * 1000:.1f}ms:"]
+        for span in breakdown:
+            lines.append(
+                f"    {span['duration'] * 1000:9.1f}ms over {span['count']:3} calls  {span['name']}"
+            )
+        lines.append(f"    {max(untracked, 0) * 1000:9.1f}ms untracked")
+
+        logger.bind(
+            interaction=trace.name, duration=round(duration, 4), spans=breakdown
+        ).warning("\n".join(lines))
@@ -1,10 +1,14 @@
-from .challenge import ChallengeView
-from .challenge_select import select_challenge
-from .flag_submission import SubmitFlagModal, submit_flag
-from .server_settings import ServerSettingsModal, resolve_server
-from .submissions import SubmissionsView, format_submissions
-from .update_challenge import UpdateChallengeModal
-from .update_status import UpdateStatusModal
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .challenge import ChallengeView
+    from .challenge_select import select_challenge
+    from .flag_submission import SubmitFlagModal, submit_flag
+    from .server_settings import ServerSettingsModal, resolve_server
+    from .submissions import SubmissionsView, format_submissions
+    from .update_challenge import UpdateChallengeModal
+    from .update_status import UpdateStatusModal
 
 __all__ = [
     "ChallengeView",
@@ -18,3 +22,27 @@ __all__ = [
     "ServerSettingsModal",
     "resolve_server",
 ]
+
+MODULES = {
+    "ChallengeView": ".challenge",
+    "UpdateChallengeModal": ".update_challenge",
+    "SubmitFlagModal": ".flag_submission",
+    "submit_flag": ".flag_submission",
+    "select_challenge": ".challenge_select",
+    "format_submissions": ".submissions",
+    "SubmissionsView": ".submissions",
+    "UpdateStatusModal": ".update_status",
+    "ServerSettingsModal": ".server_settings",
+    "resolve_server": ".server_settings",
+}
+
+
+# Each view's module is only imported once something asks for it, so that
+# loading one cog doesn't pull in the views of every other cog.
+def __getattr__(name: str) -> Any:
+    if name in MODULES:
+        value = getattr(import_module(MODULES[name], __name__), name)
+        globals()[name] = value
+        return value
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
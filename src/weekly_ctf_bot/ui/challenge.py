@@ -7,6 +7,7 @@ from .. import ChallengeBot, handle_error
 from ..database import Challenge
 from .flag_submission import SubmitFlagModal
 from .submissions import SubmissionsView, format_submissions
+from .traced import TracedModal, TracedView
 from .update_challenge import UpdateChallengeModal
 from .update_status import UpdateStatusButton
 
@@ -24,7 +25,7 @@ class SubmitFlagButton[V: ui.LayoutView](ui.Button[V]):
         )
 
 
-class DeleteModal(ui.Modal):
+class DeleteModal(TracedModal):
     def __init__(self, client: ChallengeBot, challenge: Challenge):
         super().__init__(title=f"Delete {challenge.name}")
 
@@ -45,14 +46,8 @@ class DeleteModal(ui.Modal):
 
         if self.check.component.value:
             await self.client.database.delete_challenge(self.challenge.id)
-
-            if self.challenge.id in self.client.start_events:
-                self.client.start_events[self.challenge.id].cancel()
-                del self.client.start_events[self.challenge.id]
-
-            if self.challenge.id in self.client.finish_events:
-                self.client.finish_events[self.challenge.id].cancel()
-                del self.client.finish_events[self.challenge.id]
+            self.client.challenge_index.remove(self.challenge.id)
+            self.client.cancel_jobs(self.challenge.id)
 
             embed = Embed(
                 title="Deleted challenge",
@@ -83,7 +78,9 @@ class SubmissionsButton[V: ui.LayoutView](ui.Button[V]):
         self.challenge = challenge
 
     async def callback(self, interaction: Interaction):
-        submissions = await format_submissions(self.client, self.challenge.id)
+        submissions = await format_submissions(
+            self.client, self.challenge.id, interaction.guild
+        )
         await interaction.response.send_message(
             view=SubmissionsView(self.client, self.challenge, submissions),
             ephemeral=True,
@@ -103,7 +100,7 @@ class EditButton[V: ui.LayoutView](ui.Button[V]):
         )
 
 
-class ChallengeView(ui.LayoutView):
+class ChallengeView(TracedView):
     def __init__(self, client: ChallengeBot, challenge: Challenge, is_author: bool):
         super().__init__()
 
@@ -6,6 +6,7 @@ from discord import Color, Embed, Interaction, SelectOption, ui
 
 from .. import ChallengeBot, handle_error
 from ..database import Challenge, Database
+from .traced import TracedView
 from .update_challenge import InvalidChallengeView
 
 
@@ -21,9 +22,7 @@ async def select_challenge(
     assert interaction.guild_id is not None
 
     if challenge is None or challenge.strip() == "":
-        active_challenges = await client.database.get_active_challenges(
-            interaction.guild_id
-        )
+        active_challenges = client.challenge_index.get_active(interaction.guild_id)
 
         if len(active_challenges) == 1:
             return active_challenges[0]
@@ -94,7 +93,7 @@ class ChallengeSelect[V: ui.LayoutView](ui.Select[V]):
             await interaction.response.send_modal(redirect)
 
 
-class SelectChallengeView(ui.LayoutView):
+class SelectChallengeView(TracedView):
     def __init__(
         self,
         client: ChallengeBot,
@@ -1,10 +1,11 @@
 from datetime import datetime, timezone
 from typing import Self
 
-from discord import Color, Embed, Interaction, TextChannel, ui
+from discord import Color, Embed, Interaction, ui
 
 from .. import ChallengeBot, handle_error
-from ..database import MAX_FLAG_LENGTH, Challenge
+from ..database import MAX_FLAG_LENGTH, Challenge, SubmissionResult
+from .traced import TracedModal
 
 
 async def submit_flag(
@@ -14,9 +15,9 @@ async def submit_flag(
 
     TITLE = f":triangular_flag_on_post: Flag submission for {challenge.name}"
 
-    solve = await client.database.get_solve(challenge.id, interaction.user.id)
+    result = await client.database.submit_flag(challenge, interaction.user.id, flag)
 
-    if solve is not None:
+    if result == SubmissionResult.ALREADY_SOLVED:
         embed = Embed(
             title=TITLE,
             description=f"You've already solved {challenge.name}!",
@@ -27,20 +28,7 @@ async def submit_flag(
         await interaction.response.send_message(embed=embed, ephemeral=True)
         return
 
-    is_correct = await client.database.add_submission(
-        challenge, interaction.user.id, flag
-    )
-
-    if is_correct:
-        server = await client.database.get_server(interaction.guild_id)
-        if server.solve_channel != 0:
-            channel = await client.fetch_channel(server.solve_channel)
-            assert isinstance(channel, TextChannel)
-
-            await channel.send(
-                f"<@{interaction.user.id}> just solved {challenge.name}!"
-            )
-
+    if result == SubmissionResult.CORRECT:
         embed = Embed(
             title=TITLE,
             description=f"You have solved {challenge.name}!",
@@ -48,18 +36,23 @@ async def submit_flag(
             timestamp=datetime.now(timezone.utc),
         )
 
-    else:
-        embed = Embed(
-            title=TITLE,
-            description=f"The flag `{flag}` is incorrect. Try again.",
-            color=Color.orange(),
-            timestamp=datetime.now(timezone.utc),
-        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+        # The solve channel is notified in the background, after replying.
+        client.solve_outbox.add(interaction.guild_id, challenge, interaction.user.id)
+        return
+
+    embed = Embed(
+        title=TITLE,
+        description=f"The flag `{flag}` is incorrect. Try again.",
+        color=Color.orange(),
+        timestamp=datetime.now(timezone.utc),
+    )
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
-class SubmitFlagModal(ui.Modal):
+class SubmitFlagModal(TracedModal):
     flag: ui.Label[Self] = ui.Label(
         text="What is the flag?",
         component=ui.TextInput(min_length=2, max_length=MAX_FLAG_LENGTH),
@@ -1,10 +1,24 @@
+from asyncio import gather
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Self
 
-from discord import ChannelType, Color, Embed, Interaction, Role, TextChannel, ui
+from discord import (
+    ChannelType,
+    Color,
+    Embed,
+    Forbidden,
+    Guild,
+    Interaction,
+    NotFound,
+    Role,
+    TextChannel,
+    ui,
+)
+from loguru import logger
 
 from .. import ChallengeBot, handle_error
+from .traced import TracedModal
 
 
 @dataclass
@@ -16,34 +30,54 @@ class ResolvedServer:
     solve_channel: TextChannel | None
 
 
-async def resolve_server(client: ChallengeBot, server_id: int) -> ResolvedServer:
-    server = await client.database.get_server(server_id)
-    guild = await client.fetch_guild(server_id)
+async def resolve_role(client: ChallengeBot, guild: Guild, role_id: int) -> Role | None:
+    if role_id == 0:
+        return None
 
-    author_role = (
-        None if server.author_role == 0 else await guild.fetch_role(server.author_role)
-    )
+    try:
+        return await client.objects.role(guild, role_id)
 
-    ping_role = (
-        None if server.ping_role == 0 else await guild.fetch_role(server.ping_role)
-    )
+    except NotFound, Forbidden:
+        logger.warning(f"Role {role_id} in server {guild.id} is no longer available")
+        return None
+
+
+async def resolve_channel(client: ChallengeBot, channel_id: int) -> TextChannel | None:
+    if channel_id == 0:
+        return None
+
+    try:
+        channel = await client.objects.channel(channel_id)
+
+    except NotFound, Forbidden:
+        channel = None
 
-    announcement_channel = None
-    if server.announcement_channel != 0:
-        announcement_channel = await guild.fetch_channel(server.announcement_channel)
-        assert isinstance(announcement_channel, TextChannel)
+    if not isinstance(channel, TextChannel):
+        logger.warning(f"Channel {channel_id} is no longer an available text channel")
+        return None
 
-    solve_channel = None
-    if server.solve_channel != 0:
-        solve_channel = await guild.fetch_channel(server.solve_channel)
-        assert isinstance(solve_channel, TextChannel)
+    return channel
+
+
+async def resolve_server(client: ChallengeBot, server_id: int) -> ResolvedServer:
+    server, guild = await gather(
+        client.database.get_server(server_id), client.objects.guild(server_id)
+    )
+
+    # Anything that has since been deleted is shown as unset.
+    author_role, ping_role, announcement_channel, solve_channel = await gather(
+        resolve_role(client, guild, server.author_role),
+        resolve_role(client, guild, server.ping_role),
+        resolve_channel(client, server.announcement_channel),
+        resolve_channel(client, server.solve_channel),
+    )
 
     return ResolvedServer(
         server_id, author_role, ping_role, announcement_channel, solve_channel
     )
 
 
-class ServerSettingsModal(ui.Modal):
+class ServerSettingsModal(TracedModal):
     def __init__(self, client: ChallengeBot, server: ResolvedServer):
         super().__init__(title="Server settings")
 
@@ -1,48 +1,38 @@
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Self
+from typing import Self, Sequence
 
-from discord import ButtonStyle, Color, Embed, Interaction, SelectOption, ui
+from discord import ButtonStyle, Color, Embed, Guild, Interaction, SelectOption, ui
 
 from .. import ChallengeBot, handle_error
-from ..database import Challenge, Submission
+from ..database import Challenge, Submission, SubmissionSummary
+from .traced import TracedModal, TracedView
 
 
 @dataclass
 class UserSubmissions:
     user_name: str
-    has_solved: bool
-    submissions: list[Submission]
+    summary: SubmissionSummary
 
 
 async def format_submissions(
-    client: ChallengeBot, challenge_id: int
+    client: ChallengeBot, challenge_id: int, guild: Guild | None
 ) -> dict[int, UserSubmissions]:
-    user_submissions: dict[int, UserSubmissions] = {}
-
-    for submission in await client.database.get_submissions(challenge_id):
-        if submission.user_id in user_submissions:
-            user = user_submissions[submission.user_id]
-
-        else:
-            user = UserSubmissions(
-                user_name=(await client.fetch_user(submission.user_id)).display_name,
-                has_solved=False,
-                submissions=[],
-            )
-
-            user_submissions[submission.user_id] = user
-
-        if submission.is_correct:
-            user.has_solved = True
-
-        user.submissions.append(submission)
-
-    return user_submissions
+    summaries = await client.database.get_submission_summaries(challenge_id)
+    names = await client.user_names.resolve(
+        [summary.user_id for summary in summaries], guild
+    )
+
+    return {
+        summary.user_id: UserSubmissions(
+            user_name=names[summary.user_id], summary=summary
+        )
+        for summary in summaries
+    }
 
 
 class SubmissionSelect[V: ui.Modal](ui.Select[V]):
-    def __init__(self, user: UserSubmissions):
+    def __init__(self, submissions: Sequence[Submission]):
         super().__init__(
             placeholder="Select a submission...",
             options=[
@@ -50,22 +40,22 @@ class SubmissionSelect[V: ui.Modal](ui.Select[V]):
                     label=f"{submission.id} - {submission.timestamp.isoformat()} UTC {'(solve)' if submission.is_correct else ''}",
                     value=str(submission.id),
                 )
-                for submission in user.submissions
+                for submission in submissions
             ],
         )
 
 
-class DeleteModal(ui.Modal):
+class DeleteModal(TracedModal):
     def __init__(
         self,
         client: ChallengeBot,
-        user: UserSubmissions,
+        submissions: Sequence[Submission],
     ):
         super().__init__(title="Delete submissions")
 
         self.client = client
 
-        self.submission: SubmissionSelect[Self] = SubmissionSelect(user)
+        self.submission: SubmissionSelect[Self] = SubmissionSelect(submissions)
         self.add_item(
             ui.Label(text="Select a submission to delete.", component=self.submission)
         )
@@ -91,22 +81,25 @@ class DeleteButton[V: ui.LayoutView](ui.Button[V]):
     def __init__(
         self,
         client: ChallengeBot,
-        user: UserSubmissions,
+        submissions: Sequence[Submission],
     ):
         super().__init__(label="Delete a submission", style=ButtonStyle.danger)
 
         self.client = client
-        self.user = user
+        self.submissions = submissions
 
     async def callback(self, interaction: Interaction):
-        await interaction.response.send_modal(DeleteModal(self.client, self.user))
+        await interaction.response.send_modal(
+            DeleteModal(self.client, self.submissions)
+        )
 
 
-class UserSubmissionsView(ui.LayoutView):
+class UserSubmissionsView(TracedView):
     def __init__(
         self,
         client: ChallengeBot,
         user: UserSubmissions,
+        submissions: Sequence[Submission],
         challenge: Challenge,
     ):
         super().__init__()
@@ -119,13 +112,13 @@ class UserSubmissionsView(ui.LayoutView):
         container.add_item(
             ui.TextDisplay(f"""
 # {user.user_name}'s submissions for {challenge.name}
-{"\n".join([f"{submission.id} - <t:{int(submission.timestamp.timestamp())}:S> {'(solve)' if submission.is_correct else ''}" for submission in user.submissions])}
+{"\n".join([f"{submission.id} - <t:{int(submission.timestamp.timestamp())}:S> {'(solve)' if submission.is_correct else ''}" for submission in submissions])}
 """)
         )
 
         action_row: ui.ActionRow[Self] = ui.ActionRow()
         container.add_item(action_row)
-        action_row.add_item(DeleteButton(client, user))
+        action_row.add_item(DeleteButton(client, submissions))
 
     async def on_error(
         self, interaction: Interaction, error: Exception, item: ui.Item[Self]
@@ -153,15 +146,20 @@ class UserSelect[V: ui.LayoutView](ui.Select[V]):
         )
 
     async def callback(self, interaction: Interaction):
+        user_id = int(self.values[0])
+        submissions = await self.client.database.get_user_submissions(
+            self.challenge.id, user_id
+        )
+
         await interaction.response.send_message(
             view=UserSubmissionsView(
-                self.client, self.submissions[int(self.values[0])], self.challenge
+                self.client, self.submissions[user_id], submissions, self.challenge
             ),
             ephemeral=True,
         )
 
 
-class SubmissionsView(ui.LayoutView):
+class SubmissionsView(TracedView):
     def __init__(
         self,
         client: ChallengeBot,
@@ -178,7 +176,7 @@ class SubmissionsView(ui.LayoutView):
         container.add_item(
             ui.TextDisplay(f"""
 # {challenge.name} submissions
-{"\n".join([f"- {user.user_name} - {len(user.submissions)} ({'solved' if user.has_solved else 'unsolved'})" for user in submissions.values()])}
+{"\n".join([f"- {user.user_name} - {user.summary.attempts} ({'solved' if user.summary.has_solved else 'unsolved'})" for user in submissions.values()])}
 {"There are no submissions yet." if len(submissions) == 0 else ""}
 """)
         )
@@ -0,0 +1,20 @@
+from discord import Interaction, ui
+
+from .. import ChallengeBot
+
+
+# Each interaction with a view or modal is traced on its own, like a command.
+class TracedView(ui.LayoutView):
+    client: ChallengeBot
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        self.client.tracer.start(interaction, type(self).__name__)
+        return True
+
+
+class TracedModal(ui.Modal):
+    client: ChallengeBot
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        self.client.tracer.start(interaction, type(self).__name__)
+        return True
@@ -12,6 +12,7 @@ from ..database import (
     file_list_to_str,
     str_to_file_list,
 )
+from .traced import TracedModal, TracedView
 from .update_status import UpdateStatusView
 
 
@@ -25,7 +26,7 @@ class NewChallengeButton[V: ui.LayoutView](ui.Button[V]):
         await interaction.response.send_modal(UpdateChallengeModal(self.client))
 
 
-class InvalidChallengeView(ui.LayoutView):
+class InvalidChallengeView(TracedView):
     def __init__(self, client: ChallengeBot, challenge_name: str, is_author: bool):
         super().__init__()
 
@@ -49,7 +50,7 @@ class InvalidChallengeView(ui.LayoutView):
         await handle_error(interaction, error, self.client.config)
 
 
-class UpdateChallengeModal(ui.Modal):
+class UpdateChallengeModal(TracedModal):
     def __init__(self, client: ChallengeBot, challenge: Challenge | None = None):
         super().__init__(
             title="Create new challenge" if challenge is None else "Edit challenge info"
@@ -156,6 +157,8 @@ class UpdateChallengeModal(ui.Modal):
             )
 
             self.challenge.name = self.name.value
+            await self.client.challenge_index.reload(self.challenge.id)
+            self.client.discard_prepared(self.challenge.id)
 
         await interaction.response.send_message(
             view=UpdateStatusView(self.client, self.challenge, is_creation),
@@ -5,6 +5,7 @@ from discord import Color, Embed, Interaction, ui
 
 from .. import ChallengeBot, handle_error
 from ..database import Challenge
+from .traced import TracedModal, TracedView
 
 
 class UpdateStatusButton[V: ui.LayoutView](ui.Button[V]):
@@ -20,7 +21,7 @@ class UpdateStatusButton[V: ui.LayoutView](ui.Button[V]):
         )
 
 
-class UpdateStatusView(ui.LayoutView):
+class UpdateStatusView(TracedView):
     def __init__(self, client: ChallengeBot, challenge: Challenge, is_creation: bool):
         super().__init__()
 
@@ -47,7 +48,7 @@ Successfully {"created" if is_creation else "updated"} {challenge.name}!
         await handle_error(interaction, error, self.client.config)
 
 
-class UpdateStatusModal(ui.Modal):
+class UpdateStatusModal(TracedModal):
     def __init__(
         self,
         client: ChallengeBot,
@@ -135,25 +136,12 @@ class UpdateStatusModal(ui.Modal):
             start=start,
             finish=finish,
         )
+        await self.client.challenge_index.reload(self.challenge.id)
 
-        if self.challenge.id in self.client.start_events:
-            self.client.start_events[self.challenge.id].cancel()
-            del self.client.start_events[self.challenge.id]
-
-        if self.challenge.id in self.client.finish_events:
-            self.client.finish_events[self.challenge.id].cancel()
-            del self.client.finish_events[self.challenge.id]
-
-        if not self.hidden.value:
-            challenge = self.challenge
-            challenge.start = start
-            challenge.finish = finish
-
-            now = datetime.now(timezone.utc)
-            if start > now:
-                self.client.add_start_event(challenge)
-            elif finish > now:
-                self.client.add_finish_event(challenge)
+        self.challenge.visible = not self.hidden.value
+        self.challenge.start = start
+        self.challenge.finish = finish
+        await self.client.schedule_jobs(self.challenge)
 
         embed = Embed(
             title=TITLE,
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+from statistics import median
+
+# Importing the entry point must stay cheap, so that --help and config errors
+# return straight away. Each import runs in a fresh interpreter, and the median
+# of several keeps one slow run on a busy machine from failing the test.
+IMPORT_TIME_BUDGET = 0.5
+IMPORT_RUNS = 5
+
+# Everything importing discord.py or SQLAlchemy is only loaded once needed.
+HEAVY_MODULES = ["discord", "sqlalchemy"]
+
+CODE = f"""
+import sys, time
+start = time.perf_counter()
+import weekly_ctf_bot.__main__
+print(time.perf_counter() - start)
+print(*[module for module in {HEAVY_MODULES!r} if module in sys.modules])
+"""
+
+
+def import_entry_point() -> tuple[float, str]:
+    result = subprocess.run(
+        [sys.executable, "-c", CODE], capture_output=True, text=True, check=True
+    )
+    duration, heavy = result.stdout.splitlines()
+    return float(duration), heavy
+
+
+def test_entry_point_skips_heavy_modules():
+    _, heavy = import_entry_point()
+    assert heavy == ""
+
+
+def test_entry_point_import_time():
+    durations = [import_entry_point()[0] for _ in range(IMPORT_RUNS)]
+    assert median(durations) <= IMPORT_TIME_BUDGET